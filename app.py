@@ -1,10 +1,17 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
+import math
 import os
 import time
 from datetime import datetime, date
 
+# Copy-on-Write lets DataProcessor return filtered frames without defensive
+# .copy() calls (always on from pandas 3.0, where the option is deprecated)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 # MUST be first Streamlit command
 st.set_page_config(
     page_title="Home Healthcare Analytics",
@@ -17,7 +24,7 @@ from data_processor import DataProcessor
 from fee_calculator import FeeCalculator
 from data_storage import DataStorage
 from client_service_manager import ClientServiceManager
-from utils import export_to_csv, format_currency
+from utils import export_to_csv, export_to_csv_bytes, export_to_parquet, format_currency
 from database import init_db
 from db_service import DatabaseService
 
@@ -53,6 +60,10 @@ if 'logged_in' not in st.session_state:
 if 'current_user' not in st.session_state:
     st.session_state.current_user = None
 
+# Release database sessions left open by the previous run (a run can end early
+# through st.stop()/st.rerun() or an exception and skip the close at the bottom)
+st.session_state.db_service.close_session()
+
 # Comprehensive Neumorphism UI Design System
 st.markdown("""
 <style>
@@ -859,6 +870,17 @@ def show_export_loading():
         subtitle="Formatting data for download..."
     )
 
+def login_client_address():
+    """
+    Client address used to throttle failed logins. Behind the nginx proxy every
+    connection comes from localhost, so the proxy's X-Real-IP header is used;
+    it is only trusted when the connection itself is local.
+    """
+    peer = st.context.ip_address
+    if peer in (None, '127.0.0.1', '::1'):
+        return st.context.headers.get('X-Real-IP') or 'localhost'
+    return peer
+
 def show_login_page():
     """Display login page"""
     st.markdown("""
@@ -883,9 +905,14 @@ def show_login_page():
             if submit_button:
                 if username and password:
                     db_service = st.session_state.db_service
-                    user = db_service.authenticate_user(username, password)
+                    # Failed logins are throttled per username and client address
+                    client = login_client_address()
+                    retry_after = db_service.login_retry_after(username, client)
+                    user = None if retry_after else db_service.authenticate_user(username, password, client)
                     
-                    if user:
+                    if retry_after:
+                        st.error(f"Too many login attempts, retry in {math.ceil(retry_after)} s")
+                    elif user:
                         st.session_state.logged_in = True
                         st.session_state.current_user = {
                             'username': user.username,
@@ -1734,21 +1761,23 @@ elif page == "Reports":
                             analysis = result['analysis']
                             
                             # Add client data
-                            for client, row in analysis['client_analysis'].iterrows():
+                            client_counts = analysis['client_analysis']['count']
+                            for client, count in zip(client_counts.index, client_counts.to_numpy()):
                                 all_file_reports.append({
                                     'Source_File': filename,
                                     'Type': 'Client',
                                     'Name': client,
-                                    'Visit_Count': row['count']
+                                    'Visit_Count': count
                                 })
                             
                             # Add service data
-                            for service, row in analysis['service_analysis'].iterrows():
+                            service_counts = analysis['service_analysis']['count']
+                            for service, count in zip(service_counts.index, service_counts.to_numpy()):
                                 all_file_reports.append({
                                     'Source_File': filename,
                                     'Type': 'Service',
                                     'Name': service,
-                                    'Visit_Count': row['count']
+                                    'Visit_Count': count
                                 })
                         
                         all_reports_df = pd.DataFrame(all_file_reports)
@@ -1763,17 +1792,16 @@ elif page == "Reports":
                 with batch_col3:
                     if st.button("Export Combined Data with Sources", type="secondary"):
                         # Export all data with source file information
-                        export_data = []
-                        for _, row in cleaned_data.iterrows():
-                            export_data.append({
-                                'Source_File': row.get('source_file', 'Unknown'),
-                                'Client_Name': row['A'],
-                                'Employee': row['B'],
-                                'Service_Type': row['C'],
-                                'Status': row['O']
-                            })
-                        
-                        combined_data_df = pd.DataFrame(export_data)
+                        combined_data_df = cleaned_data[['A', 'B', 'C', 'O']].rename(columns={
+                            'A': 'Client_Name',
+                            'B': 'Employee',
+                            'C': 'Service_Type',
+                            'O': 'Status'
+                        })
+                        combined_data_df.insert(
+                            0, 'Source_File',
+                            cleaned_data['source_file'] if 'source_file' in cleaned_data.columns else 'Unknown'
+                        )
                         csv_data = combined_data_df.to_csv(index=False)
                         st.download_button(
                             label="Download Combined Data CSV",
@@ -1828,16 +1856,12 @@ elif page == "Reports":
             with col2:
                 if st.button("Export All Client Services", type="secondary"):
                     # Create complete client-service detail report
-                    all_services_data = []
-                    for _, row in cleaned_data.iterrows():
-                        all_services_data.append({
-                            'Client Name': row['A'],
-                            'Employee': row['B'],
-                            'Service Type': row['C'],
-                            'Status': row['O']
-                        })
-                    
-                    all_services_df = pd.DataFrame(all_services_data)
+                    all_services_df = cleaned_data[['A', 'B', 'C', 'O']].rename(columns={
+                        'A': 'Client Name',
+                        'B': 'Employee',
+                        'C': 'Service Type',
+                        'O': 'Status'
+                    })
                     csv_data = all_services_df.to_csv(index=False)
                     st.download_button(
                         label="Download Complete Client Services CSV",
@@ -1859,17 +1883,8 @@ elif page == "Billing":
     if ('cleaned_data' in st.session_state and hasattr(st.session_state, 'fee_calculator')) or manual_entries_for_billing:
         # Get service rates from database
         db_service = st.session_state.db_service
-        all_service_types = db_service.get_all_service_types()
-        # Convert ServiceType objects to dictionaries for easier access
-        service_rates = {
-            st.name: {
-                'rate': st.default_rate,
-                'billing_method': st.billing_method,
-                'unit': st.unit_type,
-                'is_medical': st.is_medical
-            } 
-            for st in all_service_types
-        }
+        # Service rates as dictionaries for easier access (cached by the service)
+        service_rates = db_service.get_all_service_rates()
         
         # Combine electronic and manual data for billing
         all_billing_data = []
@@ -1877,15 +1892,16 @@ elif page == "Billing":
         # Add electronic data if available
         if 'cleaned_data' in st.session_state:
             cleaned_data = st.session_state.cleaned_data
-            for _, row in cleaned_data.iterrows():
-                all_billing_data.append({
-                    'client_name': row['A'],
-                    'caregiver_name': row['B'],
-                    'service_type': row['C'],
-                    'visit_count': 1,  # Each row represents one visit
-                    'source': 'Electronic',
-                    'date': 'N/A'  # Electronic data doesn't have specific dates
-                })
+            electronic_df = cleaned_data[['A', 'B', 'C']].rename(columns={
+                'A': 'client_name',
+                'B': 'caregiver_name',
+                'C': 'service_type'
+            }).assign(
+                visit_count=1,  # Each row represents one visit
+                source='Electronic',
+                date='N/A'  # Electronic data doesn't have specific dates
+            )
+            all_billing_data.extend(electronic_df.to_dict('records'))
         
         # Add manual entries from database
         for entry in manual_entries_for_billing:
@@ -2321,8 +2337,7 @@ elif page == "Client Service Configuration":
         
         # Get all clients from database
         db_service = st.session_state.db_service
-        db_clients = db_service.get_all_clients()
-        all_clients = [client.name for client in db_clients]
+        all_clients = db_service.get_client_names()
         
         if all_clients:
             # Client selection
@@ -2407,8 +2422,7 @@ elif page == "Client Service Configuration":
         
         # Get all clients from database
         db_service = st.session_state.db_service
-        db_clients = db_service.get_all_clients()
-        all_clients = [client.name for client in db_clients]
+        all_clients = db_service.get_client_names()
         
         if all_clients:
             col1, col2 = st.columns(2)
@@ -2705,8 +2719,7 @@ elif page == "Service Type Management":
             if new_service_name:
                 try:
                     # Check if service already exists
-                    existing = db_service.get_service_type_by_name(new_service_name)
-                    if existing:
+                    if db_service.service_type_exists(new_service_name):
                         st.error(f"Service type '{new_service_name}' already exists!")
                     else:
                         # Create new service type
@@ -3254,14 +3267,14 @@ elif page == "Historical Records":
             # Create summary table
             summary_data = []
             for record in filtered_history:
-                analysis = record['analysis']
+                totals = record['totals']
                 summary_data.append({
                     'Filename': record['filename'],
                     'Date': datetime.fromisoformat(record['timestamp']).strftime("%Y-%m-%d %H:%M"),
                     'Total_Rows': record['total_rows'],
-                    'Clients': len(analysis['client_analysis']),
-                    'Employees': len(analysis['employee_analysis']),
-                    'Services': len(analysis['service_analysis'])
+                    'Clients': totals['unique_clients'],
+                    'Employees': totals['unique_employees'],
+                    'Services': totals['unique_services']
                 })
             
             summary_df = pd.DataFrame(summary_data)
@@ -3293,16 +3306,17 @@ elif page == "Historical Records":
                     with col2:
                         st.markdown("**Analysis Summary**")
                         analysis = record['analysis']
-                        st.write(f"**Unique Clients:** {len(analysis['client_analysis'])}")
-                        st.write(f"**Unique Employees:** {len(analysis['employee_analysis'])}")
-                        st.write(f"**Unique Services:** {len(analysis['service_analysis'])}")
+                        totals = record['totals']
+                        st.write(f"**Unique Clients:** {totals['unique_clients']}")
+                        st.write(f"**Unique Employees:** {totals['unique_employees']}")
+                        st.write(f"**Unique Services:** {totals['unique_services']}")
                 
                 # Display analysis data
                 with st.expander("📊 Detailed Analysis Data"):
                     tab1, tab2, tab3 = st.tabs(["Client Analysis", "Employee Analysis", "Service Analysis"])
                     
                     with tab1:
-                        client_df = pd.DataFrame(analysis['client_analysis'])
+                        client_df = st.session_state.data_storage.load_analysis_frame(analysis['client_analysis'])
                         st.dataframe(client_df, use_container_width=True)
                         
                         # Export option for this record
@@ -3315,7 +3329,7 @@ elif page == "Historical Records":
                         )
                     
                     with tab2:
-                        employee_df = pd.DataFrame(analysis['employee_analysis'])
+                        employee_df = st.session_state.data_storage.load_analysis_frame(analysis['employee_analysis'])
                         st.dataframe(employee_df, use_container_width=True)
                         
                         csv_data = employee_df.to_csv()
@@ -3327,7 +3341,7 @@ elif page == "Historical Records":
                         )
                     
                     with tab3:
-                        service_df = pd.DataFrame(analysis['service_analysis'])
+                        service_df = st.session_state.data_storage.load_analysis_frame(analysis['service_analysis'])
                         st.dataframe(service_df, use_container_width=True)
                         
                         csv_data = service_df.to_csv()
@@ -3389,6 +3403,9 @@ elif page == "Export Data":
             ["Analysis Summary", "Client Analysis", "Employee Analysis", "Service Analysis", "Fee Calculation"]
         )
         
+        # CSV for spreadsheets; Parquet is smaller and keeps column types for analytics tools
+        export_format = st.radio("Export format:", ["CSV", "Parquet"], horizontal=True)
+        
         if st.button("Generate Export", type="primary"):
             try:
                 export_df = None
@@ -3438,13 +3455,19 @@ elif page == "Export Data":
                 
                 # Generate download if we have valid data
                 if export_df is not None and filename is not None:
-                    csv_data = export_to_csv(export_df)
+                    if export_format == "Parquet":
+                        filename = filename.rsplit('.', 1)[0] + '.parquet'
+                        export_data = export_to_parquet(export_df)
+                        mime = "application/vnd.apache.parquet"
+                    else:
+                        export_data = export_to_csv(export_df)
+                        mime = "text/csv"
                     
                     st.download_button(
                         label=f"Download {filename}",
-                        data=csv_data,
+                        data=export_data,
                         file_name=filename,
-                        mime="text/csv"
+                        mime=mime
                     )
                     
                     st.success(f"Export ready! Click the download button to save {filename}")
@@ -3465,24 +3488,27 @@ elif page == "Export Data":
     if history:
         if st.button("Export All Historical Data", type="secondary"):
             try:
-                # Create historical summary
-                historical_summary = []
-                for record in history:
-                    analysis = record['analysis']
-                    historical_summary.append({
-                        'filename': record['filename'],
-                        'timestamp': record['timestamp'],
-                        'total_rows': record['total_rows'],
-                        'unique_clients': len(analysis['client_analysis']),
-                        'unique_employees': len(analysis['employee_analysis']),
-                        'unique_services': len(analysis['service_analysis']),
-                        'total_client_visits': sum(analysis['client_analysis'].values()) if isinstance(analysis['client_analysis'], dict) else analysis['client_analysis']['count'].sum(),
-                        'total_employee_visits': sum(analysis['employee_analysis'].values()) if isinstance(analysis['employee_analysis'], dict) else analysis['employee_analysis']['count'].sum(),
-                        'total_service_instances': sum(analysis['service_analysis'].values()) if isinstance(analysis['service_analysis'], dict) else analysis['service_analysis']['count'].sum()
-                    })
+                # Create historical summary column-wise, one array per field
+                n_records = len(history)
+                summary_columns = {
+                    'filename': [record['filename'] for record in history],
+                    'timestamp': [record['timestamp'] for record in history],
+                    'total_rows': [record['total_rows'] for record in history]
+                }
+                # Counts come from the totals stored with each record
+                for field in ['unique_clients', 'unique_employees', 'unique_services']:
+                    summary_columns[field] = np.fromiter(
+                        (record['totals'][field] for record in history),
+                        dtype=np.int32, count=n_records
+                    )
+                for field in ['total_client_visits', 'total_employee_visits', 'total_service_instances']:
+                    summary_columns[field] = np.fromiter(
+                        (record['totals'][field] for record in history),
+                        dtype=np.int64, count=n_records
+                    )
                 
-                historical_df = pd.DataFrame(historical_summary)
-                csv_data = export_to_csv(historical_df)
+                historical_df = pd.DataFrame(summary_columns)
+                csv_data = export_to_csv_bytes(historical_df)
                 
                 st.download_button(
                     label="Download Historical Summary",
@@ -3608,3 +3634,6 @@ elif page == "Animation Demo":
 # Footer
 st.markdown("---")
 st.markdown("**Home Healthcare Analytics** - Streamline your healthcare data analysis workflow")
+
+# Return this run's database connection to the pool
+st.session_state.db_service.close_session()
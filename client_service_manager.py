@@ -3,57 +3,307 @@ Client Service Hours Management System
 Handles client-specific service hour configurations, period overrides, and historical tracking.
 """
 
+import copy
 import json
+import sqlite3
+import numpy as np
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime, date
-from typing import Dict, List, Any, Optional, Tuple
+from types import MappingProxyType
+from typing import Dict, List, Any, Mapping, Optional, Tuple
 import os
 
+from config import Config
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS client_service_hours (
+    client TEXT NOT NULL,
+    service TEXT NOT NULL,
+    default_hours REAL,
+    billing_method TEXT,
+    rate REAL,
+    created TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (client, service)
+);
+CREATE TABLE IF NOT EXISTS client_hours_history (
+    id INTEGER PRIMARY KEY,
+    ts TEXT,
+    client TEXT,
+    action TEXT,
+    service_types TEXT,
+    old_value TEXT,
+    new_value TEXT,
+    reason TEXT,
+    period_start TEXT,
+    period_end TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS history_client ON client_hours_history (client);
+CREATE INDEX IF NOT EXISTS history_ts ON client_hours_history (ts DESC);
+"""
+
+HISTORY_COLUMNS = ("ts, client, action, service_types, old_value, new_value, "
+                   "reason, period_start, period_end, details")
+
+# Loaded table contents shared across instances (one per Streamlit session),
+# keyed by (db path, table) -> (database file state, data)
+_LOAD_CACHE: Dict[Tuple[str, str], Tuple[tuple, Any]] = {}
+
 
 class ClientServiceManager:
     """Manages client service hours with default configurations, period overrides, and historical tracking."""
     
-    def __init__(self, clients_file: str = 'client_service_hours.json', history_file: str = 'client_hours_history.json'):
+    def __init__(self, db_file: Optional[str] = None,
+                 clients_file: str = 'client_service_hours.json', history_file: str = 'client_hours_history.json'):
+        self.db_file = db_file or Config.SQLITE_PATH
+        # Legacy JSON files, imported once into the database if present
         self.clients_file = clients_file
         self.history_file = history_file
+        self._batch_depth = 0
+        self._savepoint_open = False
+        # Per-client structure-of-arrays view of clients_data used for billing
+        self._client_arrays: Dict[str, Dict[str, Any]] = {}
+        self.conn = self._connect()
+        self._import_legacy_json()
         self.clients_data = self._load_clients_data()
-        self.history_data = self._load_history_data()
+        # History is loaded on first access; recent/per-client lookups query the database
+        self._history_data: Optional[List[Dict[str, Any]]] = None
+        # Serialized exports, reset by every write
+        self._clients_json_cache: Optional[str] = None
+        self._history_json_cache: Optional[str] = None
     
-    def _load_clients_data(self) -> Dict[str, Dict[str, Any]]:
-        """Load client service hours configuration from JSON file."""
+    def _connect(self) -> sqlite3.Connection:
+        """Open the SQLite database in WAL mode and create tables if needed."""
+        # Streamlit reruns the script on different threads within one session
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        return conn
+    
+    def _import_legacy_json(self):
+        """Copy clients/history from the old JSON files into empty tables, then retire the files."""
         try:
-            if os.path.exists(self.clients_file):
+            if os.path.exists(self.clients_file) and not self.conn.execute(
+                    "SELECT 1 FROM client_service_hours LIMIT 1").fetchone():
                 with open(self.clients_file, 'r') as f:
-                    return json.load(f)
-            return {}
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
+                    legacy_clients = json.load(f)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO client_service_hours VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [self._service_row(client_name, service_type, config)
+                     for client_name, services in legacy_clients.items()
+                     for service_type, config in services.items()]
+                )
+            if os.path.exists(self.history_file) and not self.conn.execute(
+                    "SELECT 1 FROM client_hours_history LIMIT 1").fetchone():
+                with open(self.history_file, 'r') as f:
+                    legacy_history = json.load(f)
+                self.conn.executemany(
+                    f"INSERT INTO client_hours_history ({HISTORY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [self._history_row(entry) for entry in legacy_history]
+                )
+            self.conn.commit()
+        except (json.JSONDecodeError, sqlite3.Error) as e:
+            self.conn.rollback()
+            print(f"Error importing legacy JSON data: {e}")
+            return
+        
+        # Keep the originals as a backup, but never import them twice
+        for legacy_file in (self.clients_file, self.history_file):
+            if os.path.exists(legacy_file):
+                os.replace(legacy_file, f"{legacy_file}.migrated")
+    
+    def _service_row(self, client_name: str, service_type: str, config: Dict[str, Any]) -> tuple:
+        """Flatten one service configuration into a client_service_hours row."""
+        return (
+            client_name,
+            service_type,
+            config.get("default_hours", 0),
+            config.get("billing_method", "hourly"),
+            config.get("rate", 0.0),
+            config.get("created_date", ""),
+            config.get("last_modified", "")
+        )
+    
+    def _history_row(self, entry: Dict[str, Any]) -> tuple:
+        """Flatten one history entry into a client_hours_history row."""
+        return (
+            entry["timestamp"],
+            entry["client_name"],
+            entry["action"],
+            json.dumps(entry.get("service_types", [])),
+            json.dumps(entry.get("old_value"), default=self._json_serializer),
+            json.dumps(entry.get("new_value"), default=self._json_serializer),
+            entry.get("reason", ""),
+            entry.get("period_start", ""),
+            entry.get("period_end", ""),
+            entry.get("details", "")
+        )
+    
+    def _history_entry(self, row: tuple) -> Dict[str, Any]:
+        """Rebuild a history entry dict from a client_hours_history row."""
+        return {
+            "timestamp": row[0],
+            "client_name": row[1],
+            "action": row[2],
+            "service_types": json.loads(row[3]),
+            "old_value": json.loads(row[4]),
+            "new_value": json.loads(row[5]),
+            "reason": row[6],
+            "period_start": row[7],
+            "period_end": row[8],
+            "details": row[9]
+        }
     
-    def _save_clients_data(self):
-        """Save client service hours configuration to JSON file."""
+    def _file_state(self) -> tuple:
+        """(mtime, size) of the database and its WAL file; changes on every committed write."""
+        state = []
+        for path in (self.db_file, f"{self.db_file}-wal"):
+            try:
+                stat = os.stat(path)
+                state.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                state.append(None)
+        return tuple(state)
+    
+    def _cached_load(self, table: str, loader):
+        """Return a private copy of loader()'s result, re-reading only if the database changed."""
+        key = (os.path.abspath(self.db_file), table)
+        state = self._file_state()
+        entry = _LOAD_CACHE.get(key)
+        if entry is None or entry[0] != state:
+            entry = (state, loader())
+            _LOAD_CACHE[key] = entry
+        return copy.deepcopy(entry[1])
+    
+    def _load_clients_data(self) -> Dict[str, Dict[str, Any]]:
+        """Load client service hours configuration, from cache if the database is unchanged."""
+        return self._cached_load('client_service_hours', self._read_clients_data)
+    
+    def _read_clients_data(self) -> Dict[str, Dict[str, Any]]:
+        """Read client service hours configuration from the database."""
+        clients_data = {}
         try:
-            with open(self.clients_file, 'w') as f:
-                json.dump(self.clients_data, f, indent=2, default=self._json_serializer)
-        except Exception as e:
-            print(f"Error saving clients data: {e}")
+            rows = self.conn.execute(
+                "SELECT client, service, default_hours, billing_method, rate, created, last_modified "
+                "FROM client_service_hours"
+            )
+            for client_name, service_type, hours, billing_method, rate, created, modified in rows:
+                clients_data.setdefault(client_name, {})[service_type] = {
+                    "default_hours": hours,
+                    "billing_method": billing_method,
+                    "rate": rate,
+                    "created_date": created,
+                    "last_modified": modified
+                }
+        except sqlite3.Error as e:
+            print(f"Error loading clients data: {e}")
+        return clients_data
     
-    def _load_history_data(self) -> List[Dict[str, Any]]:
-        """Load client service hours history from JSON file."""
+    def _save_client_services(self, client_name: str, services: Dict[str, Dict[str, Any]]):
+        """Upsert the given service configurations of a client."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO client_service_hours VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [self._service_row(client_name, service_type, config)
+             for service_type, config in services.items()]
+        )
+    
+    def _apply_client_services(self, client_name: str, services: Dict[str, Dict[str, Any]]):
+        """Mirror saved service configurations into clients_data."""
+        self.clients_data.setdefault(client_name, {}).update(services)
+        self._client_arrays.pop(client_name, None)
+        self._clients_json_cache = None
+    
+    def _begin(self):
+        """Mark the start of a write method; inside batch_updates() its statements get a savepoint."""
+        if self._batch_depth > 0:
+            self.conn.execute("SAVEPOINT op")
+            self._savepoint_open = True
+    
+    def _commit(self):
+        """
+        Commit pending writes now, or at the end of the enclosing batch_updates() block.
+        
+        sqlite3.Error propagates so callers only update in-memory state after a successful commit.
+        """
+        if self._batch_depth == 0:
+            self.conn.commit()
+        elif self._savepoint_open:
+            self._savepoint_open = False
+            self.conn.execute("RELEASE op")
+    
+    def _rollback(self):
+        """Discard a failed write; inside batch_updates() only its own statements are undone."""
+        if self._batch_depth == 0:
+            self.conn.rollback()
+        elif self._savepoint_open:
+            self._savepoint_open = False
+            self.conn.execute("ROLLBACK TO op")
+            self.conn.execute("RELEASE op")
+    
+    def _reload(self):
+        """Re-read in-memory state from the database after a rolled back batch."""
+        self.clients_data = self._read_clients_data()
+        self._history_data = None
+        self._client_arrays = {}
+        self._clients_json_cache = None
+        self._history_json_cache = None
+    
+    @contextmanager
+    def batch_updates(self):
+        """
+        Group writes into a single transaction committed when the outermost block exits.
+        
+        Usage:
+            with manager.batch_updates():
+                manager.update_client_service_hours(...)
+                manager.update_client_service_hours(...)
+        """
+        if self._batch_depth == 0 and not self.conn.in_transaction:
+            # Explicit BEGIN so releasing a write method's savepoint doesn't commit
+            self.conn.execute("BEGIN")
+        self._batch_depth += 1
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r') as f:
-                    return json.load(f)
-            return []
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
+            yield self
+        except Exception:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.conn.rollback()
+                self._reload()
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            try:
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()
+                self._reload()
+                raise
     
-    def _save_history_data(self):
-        """Save client service hours history to JSON file."""
+    @property
+    def history_data(self) -> List[Dict[str, Any]]:
+        """Full change history, oldest first (loaded lazily)."""
+        if self._history_data is None:
+            self._history_data = self._load_history_data()
+        return self._history_data
+    
+    def _load_history_data(self) -> List[Dict[str, Any]]:
+        """Load client service hours history, from cache if the database is unchanged."""
+        return self._cached_load('client_hours_history', self._read_history_data)
+    
+    def _read_history_data(self) -> List[Dict[str, Any]]:
+        """Read client service hours history from the database, oldest first."""
         try:
-            with open(self.history_file, 'w') as f:
-                json.dump(self.history_data, f, indent=2, default=self._json_serializer)
-        except Exception as e:
-            print(f"Error saving history data: {e}")
+            rows = self.conn.execute(
+                f"SELECT {HISTORY_COLUMNS} FROM client_hours_history ORDER BY id"
+            )
+            return [self._history_entry(row) for row in rows]
+        except sqlite3.Error as e:
+            print(f"Error loading history data: {e}")
+            return []
     
     def _json_serializer(self, obj):
         """Custom JSON serializer for date objects."""
@@ -74,31 +324,39 @@ class ClientServiceManager:
             bool: True if successful, False otherwise
         """
         try:
-            if client_name not in self.clients_data:
-                self.clients_data[client_name] = {}
+            # One timestamp for every record written by this operation
+            now_iso = datetime.now().isoformat()
             
             # Add or update service types for the client
-            for service_type, config in service_types.items():
-                self.clients_data[client_name][service_type] = {
+            services = {
+                service_type: {
                     "default_hours": config.get("default_hours", 0),
                     "billing_method": config.get("billing_method", "hourly"),
                     "rate": config.get("rate", 0.0),
-                    "created_date": datetime.now().isoformat(),
-                    "last_modified": datetime.now().isoformat()
+                    "created_date": now_iso,
+                    "last_modified": now_iso
                 }
+                for service_type, config in service_types.items()
+            }
             
-            self._save_clients_data()
+            self._begin()
+            self._save_client_services(client_name, services)
             
             # Log the addition to history
-            self._log_history(
+            history_entry = self._log_history(
                 client_name=client_name,
                 action="client_added",
                 service_types=list(service_types.keys()),
-                details=f"Client added with {len(service_types)} service types"
+                details=f"Client added with {len(service_types)} service types",
+                timestamp=now_iso
             )
+            self._commit()
             
+            self._apply_client_services(client_name, services)
+            self._apply_history(history_entry)
             return True
         except Exception as e:
+            self._rollback()
             print(f"Error adding client: {e}")
             return False
     
@@ -122,25 +380,32 @@ class ClientServiceManager:
             if service_type not in self.clients_data[client_name]:
                 return False
             
-            old_hours = self.clients_data[client_name][service_type]["default_hours"]
-            self.clients_data[client_name][service_type]["default_hours"] = new_hours
-            self.clients_data[client_name][service_type]["last_modified"] = datetime.now().isoformat()
+            now_iso = datetime.now().isoformat()
+            config = self.clients_data[client_name][service_type]
+            old_hours = config["default_hours"]
+            services = {service_type: {**config, "default_hours": new_hours, "last_modified": now_iso}}
             
-            self._save_clients_data()
+            self._begin()
+            self._save_client_services(client_name, services)
             
             # Log the change to history
-            self._log_history(
+            history_entry = self._log_history(
                 client_name=client_name,
                 action="hours_updated",
                 service_types=[service_type],
                 old_value=old_hours,
                 new_value=new_hours,
                 reason=reason,
-                details=f"Default hours changed from {old_hours} to {new_hours}"
+                details=f"Default hours changed from {old_hours} to {new_hours}",
+                timestamp=now_iso
             )
+            self._commit()
             
+            self._apply_client_services(client_name, services)
+            self._apply_history(history_entry)
             return True
         except Exception as e:
+            self._rollback()
             print(f"Error updating client service hours: {e}")
             return False
     
@@ -166,7 +431,8 @@ class ClientServiceManager:
                 return False
             
             # Log the override to history
-            self._log_history(
+            self._begin()
+            history_entry = self._log_history(
                 client_name=client_name,
                 action="period_override",
                 service_types=[service_type],
@@ -177,9 +443,12 @@ class ClientServiceManager:
                 reason=reason,
                 details=f"Period override: {default_hours} → {override_hours} hours from {period_start} to {period_end}"
             )
+            self._commit()
             
+            self._apply_history(history_entry)
             return True
         except Exception as e:
+            self._rollback()
             print(f"Error applying period override: {e}")
             return False
     
@@ -201,7 +470,7 @@ class ClientServiceManager:
         except Exception:
             return None
     
-    def get_client_service_config(self, client_name: str, service_type: str) -> Optional[Dict[str, Any]]:
+    def get_client_service_config(self, client_name: str, service_type: str) -> Optional[Mapping[str, Any]]:
         """
         Get complete service configuration for a client's service type.
         
@@ -210,11 +479,12 @@ class ClientServiceManager:
             service_type: Type of service
         
         Returns:
-            dict: Service configuration if found, None otherwise
+            Mapping: Read-only view of the service configuration if found, None otherwise.
+                     Use dict(config) if a mutable copy is needed.
         """
         try:
             if client_name in self.clients_data and service_type in self.clients_data[client_name]:
-                return self.clients_data[client_name][service_type].copy()
+                return MappingProxyType(self.clients_data[client_name][service_type])
             return None
         except Exception:
             return None
@@ -260,48 +530,61 @@ class ClientServiceManager:
         Returns:
             dict: Billing details for each service type
         """
-        billing_results = {}
         period_overrides = period_overrides or {}
+        arrays = self._get_client_arrays(client_name)
+        service_to_idx = arrays["service_to_idx"]
         
-        for service_type, visit_count in service_analysis.items():
-            config = self.get_client_service_config(client_name, service_type)
-            if not config:
-                continue
-            
-            # Use override hours if available, otherwise use default hours
-            hours = period_overrides.get(service_type, config["default_hours"])
-            rate = config["rate"]
-            billing_method = config["billing_method"]
-            
-            if billing_method == "hourly":
-                total_amount = hours * rate
-                billing_results[service_type] = {
-                    "hours": hours,
-                    "rate": rate,
-                    "billing_method": billing_method,
-                    "total_amount": total_amount,
-                    "visit_count": visit_count,
-                    "is_override": service_type in period_overrides
-                }
-            else:
-                # For future unit-based billing
-                billing_results[service_type] = {
-                    "units": hours,  # Will be converted to 15-min units later
-                    "rate": rate,
-                    "billing_method": billing_method,
-                    "total_amount": hours * rate,
-                    "visit_count": visit_count,
-                    "is_override": service_type in period_overrides
-                }
+        matched = [service_type for service_type in service_analysis if service_type in service_to_idx]
+        if not matched:
+            return {}
+        
+        count = len(matched)
+        idx = np.fromiter((service_to_idx[s] for s in matched), dtype=np.intp, count=count)
+        is_override = np.fromiter((s in period_overrides for s in matched), dtype=bool, count=count)
+        override_hours = np.fromiter((period_overrides.get(s, 0.0) for s in matched), dtype=np.float64, count=count)
+        
+        # Use override hours if available, otherwise use default hours
+        hours = np.where(is_override, override_hours, arrays["hours"][idx])
+        rates = arrays["rate"][idx]
+        totals = hours * rates
+        methods = arrays["method"]
         
-        return billing_results
+        # Unit-based billing reports "units" (converted to 15-min units later) instead of "hours"
+        return {
+            service_type: {
+                "hours" if methods[i] == "hourly" else "units": h,
+                "rate": r,
+                "billing_method": methods[i],
+                "total_amount": t,
+                "visit_count": service_analysis[service_type],
+                "is_override": o
+            }
+            for service_type, i, h, r, t, o in zip(
+                matched, idx.tolist(), hours.tolist(), rates.tolist(), totals.tolist(), is_override.tolist()
+            )
+        }
+    
+    def _get_client_arrays(self, client_name: str) -> Dict[str, Any]:
+        """Build (or reuse) parallel hours/rate/method arrays for a client's services."""
+        arrays = self._client_arrays.get(client_name)
+        if arrays is None:
+            services = self.clients_data.get(client_name, {})
+            arrays = {
+                "service_to_idx": {service_type: i for i, service_type in enumerate(services)},
+                "hours": np.array([c["default_hours"] for c in services.values()], dtype=np.float64),
+                "rate": np.array([c["rate"] for c in services.values()], dtype=np.float64),
+                "method": [c["billing_method"] for c in services.values()]
+            }
+            self._client_arrays[client_name] = arrays
+        return arrays
     
     def _log_history(self, client_name: str, action: str, service_types: List[str], 
                     old_value: Any = None, new_value: Any = None, reason: str = "",
-                    period_start: str = "", period_end: str = "", details: str = ""):
-        """Log changes to client service hours history."""
+                    period_start: str = "", period_end: str = "", details: str = "",
+                    timestamp: Optional[str] = None) -> Dict[str, Any]:
+        """Write a history entry for a change; apply it with _apply_history() once committed."""
         history_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp or datetime.now().isoformat(),
             "client_name": client_name,
             "action": action,
             "service_types": service_types,
@@ -313,50 +596,91 @@ class ClientServiceManager:
             "details": details
         }
         
-        self.history_data.append(history_entry)
-        self._save_history_data()
+        self.conn.execute(
+            f"INSERT INTO client_hours_history ({HISTORY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            self._history_row(history_entry)
+        )
+        return history_entry
+    
+    def _apply_history(self, history_entry: Dict[str, Any]):
+        """Mirror a saved history entry into history_data."""
+        if self._history_data is not None:
+            self._history_data.append(history_entry)
+        self._history_json_cache = None
     
     def get_client_history(self, client_name: str) -> List[Dict[str, Any]]:
         """Get history of changes for a specific client."""
-        return [entry for entry in self.history_data if entry["client_name"] == client_name]
+        rows = self.conn.execute(
+            f"SELECT {HISTORY_COLUMNS} FROM client_hours_history WHERE client = ? ORDER BY id",
+            (client_name,)
+        )
+        return [self._history_entry(row) for row in rows]
     
     def get_recent_history(self, n: int = 50) -> List[Dict[str, Any]]:
-        """Get recent history entries."""
-        return sorted(self.history_data, key=lambda x: x["timestamp"], reverse=True)[:n]
+        """Get recent history entries, newest first."""
+        if n <= 0:
+            return []
+        if self._history_data is not None:
+            # history_data is kept in insertion (= chronological) order, so the
+            # newest n entries are simply its tail
+            return list(reversed(self._history_data[-n:]))
+        rows = self.conn.execute(
+            f"SELECT {HISTORY_COLUMNS} FROM client_hours_history ORDER BY id DESC LIMIT ?", (n,)
+        )
+        return [self._history_entry(row) for row in rows]
     
     def export_clients_data(self) -> str:
         """Export clients data as JSON string."""
-        return json.dumps(self.clients_data, indent=2, default=self._json_serializer)
+        if self._clients_json_cache is None:
+            self._clients_json_cache = json.dumps(self.clients_data, indent=2, default=self._json_serializer)
+        return self._clients_json_cache
     
     def export_history_data(self) -> str:
         """Export history data as JSON string."""
-        return json.dumps(self.history_data, indent=2, default=self._json_serializer)
+        if self._history_json_cache is None:
+            self._history_json_cache = json.dumps(self.history_data, indent=2, default=self._json_serializer)
+        return self._history_json_cache
     
     def delete_client(self, client_name: str) -> bool:
         """Delete a client and all their service configurations."""
         try:
             if client_name in self.clients_data:
                 service_types = list(self.clients_data[client_name].keys())
-                del self.clients_data[client_name]
-                self._save_clients_data()
+                self._begin()
+                self.conn.execute("DELETE FROM client_service_hours WHERE client = ?", (client_name,))
                 
                 # Log the deletion
-                self._log_history(
+                history_entry = self._log_history(
                     client_name=client_name,
                     action="client_deleted",
                     service_types=service_types,
                     details=f"Client deleted with {len(service_types)} service types"
                 )
+                self._commit()
                 
+                del self.clients_data[client_name]
+                self._client_arrays.pop(client_name, None)
+                self._clients_json_cache = None
+                self._apply_history(history_entry)
                 return True
             return False
         except Exception as e:
+            self._rollback()
             print(f"Error deleting client: {e}")
             return False
     
     def clear_all_data(self):
         """Clear all client data and history (use with caution)."""
+        try:
+            self._begin()
+            self.conn.execute("DELETE FROM client_service_hours")
+            self.conn.execute("DELETE FROM client_hours_history")
+            self._commit()
+        except sqlite3.Error:
+            self._rollback()
+            raise
         self.clients_data = {}
-        self.history_data = []
-        self._save_clients_data()
-        self._save_history_data()
\ No newline at end of file
+        self._history_data = []
+        self._client_arrays = {}
+        self._clients_json_cache = None
+        self._history_json_cache = None
\ No newline at end of file
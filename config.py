@@ -3,6 +3,7 @@ Configuration Management for Healthcare Analyzer
 Supports multiple database types and deployment environments
 """
 import os
+from functools import lru_cache
 from typing import Optional
 
 class Config:
@@ -42,10 +43,14 @@ class Config:
     SESSION_TIMEOUT_MINUTES = int(os.getenv('SESSION_TIMEOUT_MINUTES', 120))
     
     @classmethod
+    @lru_cache(maxsize=1)
     def get_database_url(cls) -> str:
         """
         Generate database URL based on configuration
         Returns connection string for SQLAlchemy
+        
+        The settings are read once at import time, so the result is cached;
+        call Config.get_database_url.cache_clear() after changing them.
         """
         db_type = cls.DATABASE_TYPE.lower()
         
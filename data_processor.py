@@ -1,7 +1,13 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 
+# Frames with at least this many rows are counted with Arrow's hash aggregation
+ARROW_COUNT_MIN_ROWS = 100_000
+
 class DataProcessor:
     """Handles data import, cleaning, and analysis for healthcare visit data."""
     
@@ -14,6 +20,7 @@ class DataProcessor:
         - Only retain rows where Column O contains 'verified' (case-insensitive)
         - Remove 'omit' entries completely
         - Strip whitespace from columns A, B, and C
+        - Drop rows where A, B, or C is missing or blank (nulls stay <NA>, never 'nan')
         - Ignore columns E through R during processing
         """
         # Ensure we have the required columns
@@ -25,31 +32,22 @@ class DataProcessor:
             else:
                 raise ValueError("Required columns not found in the data")
         
-        # Make a copy to avoid warnings
-        working_df = df.copy()
-        
-        # Clean Column O and filter for 'verified' only
-        if 'O' in working_df.columns:
-            working_df['O'] = working_df['O'].astype(str).str.lower().str.strip()
-            # Only keep rows where Column O contains 'verified'
-            cleaned_df = working_df[working_df['O'] == 'verified'].copy()
-        else:
-            raise ValueError("Column O not found in the data")
+        # Arrow-backed strings: lower/strip/compare run as vectorized Arrow kernels
+        # instead of per-element Python calls (also returns a new frame, so no copy needed)
+        working_df = df.astype({col: 'string[pyarrow]' for col in self.required_columns})
         
-        # Clean columns A, B, and C
+        # Clean Column O and columns A, B, and C
+        working_df['O'] = working_df['O'].str.strip().str.lower()
         for col in ['A', 'B', 'C']:
-            if col in cleaned_df.columns:
-                cleaned_df[col] = cleaned_df[col].astype(str).str.strip()
+            working_df[col] = working_df[col].str.strip()
         
-        # Remove rows with null values in A, B, or C
-        cleaned_df = cleaned_df.dropna(subset=['A', 'B', 'C'])
-        
-        # Remove rows where A, B, or C are empty after stripping
-        cleaned_df = cleaned_df[
-            (cleaned_df['A'] != '') & 
-            (cleaned_df['B'] != '') & 
-            (cleaned_df['C'] != '')
-        ].copy()
+        # One row mask: Column O is 'verified' and A, B, C are all non-empty after
+        # stripping (missing values count as empty, so no separate dropna pass)
+        mask = np.logical_and.reduce([
+            working_df['O'].eq('verified').fillna(False).to_numpy(dtype=bool),
+            *(working_df[col].str.len().fillna(0).to_numpy() > 0 for col in ['A', 'B', 'C'])
+        ])
+        cleaned_df = working_df.loc[mask]
         
         return cleaned_df
     
@@ -59,21 +57,59 @@ class DataProcessor:
         Returns a dictionary with analysis results for each category.
         """
         analysis_results = {}
+        counts = self._count_columns(df)
         
         # Analyze Client Names (Column A)
-        client_counts = df['A'].value_counts()
-        analysis_results['client_analysis'] = client_counts.to_frame('count')
+        analysis_results['client_analysis'] = counts['A'].to_frame('count')
         
         # Analyze Employee Visits (Column B)
-        employee_counts = df['B'].value_counts()
-        analysis_results['employee_analysis'] = employee_counts.to_frame('count')
+        analysis_results['employee_analysis'] = counts['B'].to_frame('count')
         
         # Analyze Services Provided (Column C)
-        service_counts = df['C'].value_counts()
-        analysis_results['service_analysis'] = service_counts.to_frame('count')
+        analysis_results['service_analysis'] = counts['C'].to_frame('count')
         
         return analysis_results
     
+    def _count_columns(self, df: pd.DataFrame) -> Dict[str, pd.Series]:
+        """Value counts for columns A, B and C, sorted by count descending."""
+        columns = ['A', 'B', 'C']
+        # Categorical columns are counted from their codes, which also keeps
+        # zero-count categories; only the rest go through Arrow
+        arrow_columns = [col for col in columns if not isinstance(df[col].dtype, pd.CategoricalDtype)]
+        counts = {}
+        if len(df) >= ARROW_COUNT_MIN_ROWS and arrow_columns:
+            # Convert once to a columnar Arrow table and aggregate the columns
+            # concurrently; Arrow kernels release the GIL
+            table = pa.Table.from_pandas(df[arrow_columns], preserve_index=False)
+            with ThreadPoolExecutor(max_workers=len(arrow_columns)) as pool:
+                futures = {col: pool.submit(self._arrow_value_counts, table, col) for col in arrow_columns}
+                counts = {col: future.result() for col, future in futures.items()}
+        return {col: counts[col] if col in counts else self._value_counts(df[col]) for col in columns}
+    
+    def _arrow_value_counts(self, table: pa.Table, column: str) -> pd.Series:
+        """Equivalent of _value_counts() using Arrow's group_by/count kernel (nulls dropped)."""
+        grouped = table.group_by(column).aggregate([(column, 'count', pc.CountOptions(mode='only_valid'))])
+        grouped = grouped.filter(pc.is_valid(grouped[column]))
+        result = grouped.to_pandas().set_index(column)[f'{column}_count'].rename('count')
+        # Ties in the same (sorted value) order as the category-code path
+        return result.sort_index(kind='stable').sort_values(ascending=False, kind='stable')
+    
+    def _value_counts(self, column: pd.Series) -> pd.Series:
+        """
+        Equivalent of column.value_counts() that counts integer category codes
+        instead of hashing every string value.
+        """
+        # Already category-encoded columns are counted straight from their codes
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            categorical = column
+        else:
+            categorical = column.astype('category')
+        codes = categorical.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(categorical.cat.categories))
+        
+        result = pd.Series(counts, index=pd.Index(categorical.cat.categories, name=column.name), name='count')
+        return result.sort_values(ascending=False, kind='stable')
+    
     def get_summary_statistics(self, analysis_results: Dict[str, Any]) -> Dict[str, Any]:
         """Generate summary statistics from analysis results."""
         summary = {
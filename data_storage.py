@@ -1,50 +1,206 @@
-import json
+import base64
 import os
+from collections import defaultdict, deque
 from datetime import datetime
-from typing import List, Dict, Any
-import pandas as pd
+from itertools import islice
+from typing import List, Dict, Any, Optional, Tuple
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Only the most recent records are kept to prevent the file from growing too large
+MAX_HISTORY_RECORDS = 50
+
+# Saves append to the file until it holds this many lines, then it is compacted
+# back to the most recent MAX_HISTORY_RECORDS
+COMPACT_HISTORY_RECORDS = 2 * MAX_HISTORY_RECORDS
+
+# numpy scalars/arrays natively, non-string dict keys (index labels) as strings like
+# json.dump did; anything else unknown is stored as its str()
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Marker for result frames stored as base64-encoded Arrow IPC files
+ARROW_FORMAT = 'arrow'
+
+# Smaller result frames are stored in the {name: {'count': n}} dict form, which is
+# more compact than an Arrow blob and cheap to build at this size
+ARROW_FRAME_MIN_ROWS = 1000
+
+# (analysis key, unique count field, total count field) for the stored totals sidecar
+TOTALS_FIELDS = [
+    ('client_analysis', 'unique_clients', 'total_client_visits'),
+    ('employee_analysis', 'unique_employees', 'total_employee_visits'),
+    ('service_analysis', 'unique_services', 'total_service_instances')
+]
 
 class DataStorage:
     """Handles persistent storage of analysis data and historical records."""
     
-    def __init__(self, history_file: str = 'analysis_history.json'):
+    def __init__(self, history_file: str = 'analysis_history.jsonl'):
         self.history_file = history_file
-        self.history = self._load_history()
+        self._skipped_lines = False
+        # Lines in the history file, including older records past MAX_HISTORY_RECORDS
+        self._file_records = 0
+        loaded = self._load_history()
+        self.history = deque(loaded, maxlen=MAX_HISTORY_RECORDS)
+        # Bumped on every change; get_analysis_history() reuses its list until then
+        self._history_version = 0
+        self._snapshot: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+        # filename -> records, kept in step with self.history
+        self._rebuild_filename_index()
+        migrated = not os.path.exists(self.history_file) and bool(self.history)
+        # Rewrite once if the file needs converting, repairing or compacting, so later saves can just append
+        oversized = self._file_records > COMPACT_HISTORY_RECORDS
+        if self._backfill_totals() or migrated or oversized or self._skipped_lines:
+            self._save_history()
     
     def _load_history(self) -> List[Dict[str, Any]]:
-        """Load analysis history from JSON file."""
+        """Load the most recent records from the JSON Lines file (one record per line)."""
         if os.path.exists(self.history_file):
             try:
-                with open(self.history_file, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, IOError):
+                with open(self.history_file, 'rb') as f:
+                    lines = f.read().splitlines()
+            except IOError:
+                return []
+            self._file_records = len(lines)
+            # Only the newest MAX_HISTORY_RECORDS lines are parsed; older ones wait for compaction
+            history = []
+            for line in reversed(lines):
+                if len(history) == MAX_HISTORY_RECORDS:
+                    break
+                try:
+                    history.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    # Skip a partially written line rather than lose the whole history
+                    self._skipped_lines = True
+            history.reverse()
+            return history
+        return self._load_legacy_history()
+    
+    def _load_legacy_history(self) -> List[Dict[str, Any]]:
+        """Load history from the older single-array .json file, if one sits next to the .jsonl path."""
+        root, ext = os.path.splitext(self.history_file)
+        legacy_file = f"{root}.json"
+        if ext == '.jsonl' and os.path.exists(legacy_file):
+            try:
+                with open(legacy_file, 'rb') as f:
+                    return orjson.loads(f.read())
+            except (orjson.JSONDecodeError, IOError):
                 return []
         return []
     
+    def _dumps_record(self, record: Dict[str, Any]) -> bytes:
+        """Serialize one history record as a JSON Lines line."""
+        return orjson.dumps(record, default=str, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+    
     def _save_history(self):
-        """Save analysis history to JSON file."""
+        """Rewrite the whole history file (used when compacting, deleting, clearing or importing)."""
+        # Write a temp file and rename it over the target so a crash mid-write
+        # never leaves a truncated history behind
+        tmp_file = f"{self.history_file}.tmp.{os.getpid()}"
         try:
-            with open(self.history_file, 'w') as f:
-                json.dump(self.history, f, indent=2, default=self._json_serializer)
+            with open(tmp_file, 'wb') as f:
+                f.write(b''.join(self._dumps_record(record) for record in self.history))
+            os.replace(tmp_file, self.history_file)
+            self._file_records = len(self.history)
         except IOError:
             pass  # Silently fail if unable to save
     
-    def _json_serializer(self, obj):
-        """Custom JSON serializer for pandas objects."""
-        if isinstance(obj, pd.DataFrame):
-            return obj.to_dict('index')
-        elif isinstance(obj, pd.Series):
-            return obj.to_dict()
-        return str(obj)
+    def _append_history(self, record: Dict[str, Any]):
+        """Append a single record to the history file."""
+        try:
+            with open(self.history_file, 'ab') as f:
+                f.write(self._dumps_record(record))
+            self._file_records += 1
+        except IOError:
+            pass  # Silently fail if unable to save
+    
+    def _rebuild_filename_index(self):
+        """Rebuild the filename -> records index used by get_analysis_by_filename."""
+        self._by_filename: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for record in self.history:
+            self._by_filename[record['filename']].append(record)
+    
+    def _encode_frame(self, frame) -> Dict[str, Any]:
+        """
+        Serialize a result DataFrame as a base64 Arrow IPC file. The index is stored
+        as ordinary columns named in 'index', without the per-blob pandas schema metadata.
+        """
+        flat = frame.reset_index()
+        index_columns = list(flat.columns[:frame.index.nlevels])
+        table = pa.Table.from_pandas(flat, preserve_index=False).replace_schema_metadata(None)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        return {
+            'format': ARROW_FORMAT,
+            'index': index_columns,
+            'data': base64.b64encode(sink.getvalue().to_pybytes()).decode('ascii')
+        }
+    
+    def _decode_table(self, value: Dict[str, Any]) -> pa.Table:
+        """Read a frame stored by _encode_frame back as an Arrow table."""
+        return pa.ipc.open_file(pa.py_buffer(base64.b64decode(value['data']))).read_all()
+    
+    def _is_encoded_frame(self, value: Any) -> bool:
+        """True if value is a result frame stored by _encode_frame."""
+        return isinstance(value, dict) and value.get('format') == ARROW_FORMAT and 'data' in value
+    
+    def load_analysis_frame(self, value: Any):
+        """
+        Turn a stored analysis result back into a DataFrame, whether it was saved
+        as an Arrow blob or in the older {name: {'count': n}} dict form.
+        """
+        if self._is_encoded_frame(value):
+            frame = self._decode_table(value).to_pandas()
+            # Blobs without 'index' carry pandas metadata and come back indexed already
+            return frame.set_index(value['index']) if value.get('index') else frame
+        import pandas as pd
+        return pd.DataFrame.from_dict(value or {}, orient='index')
+    
+    def _compute_totals(self, analysis: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Unique and total counts for an analysis whose categories are DataFrames,
+        Arrow blobs or {name: {'count': n}} dicts.
+        """
+        totals = {}
+        for category, unique_field, total_field in TOTALS_FIELDS:
+            data = analysis.get(category, {})
+            if hasattr(data, 'columns'):
+                totals[unique_field] = len(data)
+                totals[total_field] = int(data['count'].sum()) if 'count' in data.columns else 0
+                continue
+            if self._is_encoded_frame(data):
+                table = self._decode_table(data)
+                totals[unique_field] = table.num_rows
+                totals[total_field] = int(pc.sum(table['count']).as_py() or 0) if 'count' in table.column_names else 0
+                continue
+            totals[unique_field] = len(data)
+            totals[total_field] = int(sum(v['count'] if isinstance(v, dict) else v for v in data.values()))
+        return totals
+    
+    def _backfill_totals(self) -> bool:
+        """Add the totals sidecar to records saved before it existed. Returns True if any were added."""
+        missing = [record for record in self.history if 'totals' not in record]
+        for record in missing:
+            record['totals'] = self._compute_totals(record.get('analysis', {}))
+        return bool(missing)
     
     def save_analysis(self, filename: str, analysis_results: Dict[str, Any], total_rows: int):
         """Save analysis results to history."""
-        # Convert pandas DataFrames to serializable format
+        # Convert pandas DataFrames/Series to serializable format (duck-typed so
+        # this module does not need to import pandas). Large DataFrames are stored
+        # as Arrow IPC blobs, small ones as dicts; read either back with load_analysis_frame()
         serializable_results = {}
+        frames = {}
         for key, value in analysis_results.items():
-            if isinstance(value, pd.DataFrame):
-                serializable_results[key] = value.to_dict('index')
-            elif isinstance(value, pd.Series):
+            if hasattr(value, 'to_dict') and hasattr(value, 'columns'):
+                frames[key] = value
+                if len(value) >= ARROW_FRAME_MIN_ROWS:
+                    serializable_results[key] = self._encode_frame(value)
+                else:
+                    serializable_results[key] = value.to_dict('index')
+            elif hasattr(value, 'to_dict') and hasattr(value, 'index'):
                 serializable_results[key] = value.to_dict()
             else:
                 serializable_results[key] = value
@@ -54,44 +210,63 @@ class DataStorage:
             'filename': filename,
             'timestamp': datetime.now().isoformat(),
             'total_rows': total_rows,
-            'analysis': serializable_results
+            'analysis': serializable_results,
+            # From the frames themselves rather than their encoded form
+            'totals': self._compute_totals({**serializable_results, **frames})
         }
         
-        # Add to history
+        # Add to history; a full deque drops its oldest record, which is also
+        # the oldest entry of its filename's list
+        if len(self.history) == self.history.maxlen:
+            dropped = self.history[0]
+            records = self._by_filename[dropped['filename']]
+            records.pop(0)
+            if not records:
+                del self._by_filename[dropped['filename']]
         self.history.append(record)
+        self._history_version += 1
+        self._by_filename[filename].append(record)
         
-        # Keep only last 50 records to prevent file from growing too large
-        if len(self.history) > 50:
-            self.history = self.history[-50:]
-        
-        # Save to file
-        self._save_history()
+        # Append a single line; dropped records stay in the file until it is compacted
+        if self._file_records >= COMPACT_HISTORY_RECORDS:
+            self._save_history()
+        else:
+            self._append_history(record)
     
     def get_analysis_history(self) -> List[Dict[str, Any]]:
-        """Get all analysis history records."""
-        return self.history.copy()
+        """Get all analysis history records (shared until history changes; treat as read-only)."""
+        if self._snapshot is None or self._snapshot[0] != self._history_version:
+            self._snapshot = (self._history_version, list(self.history))
+        return self._snapshot[1]
     
     def get_recent_analyses(self, n: int = 10) -> List[Dict[str, Any]]:
         """Get the most recent n analysis records."""
-        return self.history[-n:] if len(self.history) >= n else self.history.copy()
+        return list(islice(self.history, max(0, len(self.history) - n), None))
     
     def get_analysis_by_filename(self, filename: str) -> List[Dict[str, Any]]:
         """Get all analysis records for a specific filename."""
-        return [record for record in self.history if record['filename'] == filename]
+        return list(self._by_filename.get(filename, ()))
     
     def delete_analysis(self, timestamp: str) -> bool:
         """Delete an analysis record by timestamp."""
         original_length = len(self.history)
-        self.history = [record for record in self.history if record['timestamp'] != timestamp]
+        self.history = deque(
+            (record for record in self.history if record['timestamp'] != timestamp),
+            maxlen=MAX_HISTORY_RECORDS
+        )
         
         if len(self.history) < original_length:
+            self._history_version += 1
+            self._rebuild_filename_index()
             self._save_history()
             return True
         return False
     
     def clear_history(self):
         """Clear all analysis history."""
-        self.history = []
+        self.history = deque(maxlen=MAX_HISTORY_RECORDS)
+        self._history_version += 1
+        self._rebuild_filename_index()
         self._save_history()
     
     def get_history_summary(self) -> Dict[str, Any]:
@@ -124,18 +299,22 @@ class DataStorage:
         
         return summary
     
-    def export_history(self) -> str:
-        """Export analysis history as JSON string."""
-        return json.dumps(self.history, indent=2, default=self._json_serializer)
+    def export_history(self, pretty: bool = False) -> str:
+        """Export analysis history as JSON string (compact unless pretty=True)."""
+        option = ORJSON_OPTIONS | orjson.OPT_INDENT_2 if pretty else ORJSON_OPTIONS
+        return orjson.dumps(list(self.history), default=str, option=option).decode('utf-8')
     
     def import_history(self, history_json: str) -> bool:
         """Import analysis history from JSON string."""
         try:
-            imported_history = json.loads(history_json)
+            imported_history = orjson.loads(history_json)
             if isinstance(imported_history, list):
-                self.history = imported_history
+                self.history = deque(imported_history, maxlen=MAX_HISTORY_RECORDS)
+                self._history_version += 1
+                self._rebuild_filename_index()
+                self._backfill_totals()
                 self._save_history()
                 return True
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             pass
         return False
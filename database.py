@@ -3,10 +3,14 @@ Database models and connection management
 Supports MySQL, PostgreSQL, and SQLite
 """
 import os
+import threading
 import bcrypt
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import create_engine, inspect, insert, text, Column, Index, Integer, String, Float, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship, deferred
 from datetime import datetime
 from config import Config
 
@@ -22,7 +26,7 @@ except Exception as e:
 # Create engine with appropriate settings
 engine_kwargs = {
     'pool_pre_ping': True,  # Verify connections before using
-    'pool_recycle': 3600,   # Recycle connections after 1 hour
+    'pool_recycle': 1800,   # Recycle connections after 30 minutes, ahead of typical server idle timeouts
 }
 
 # Add MySQL-specific settings
@@ -42,12 +46,23 @@ elif 'postgresql' in DATABASE_URL:
 # Create engine
 engine = create_engine(DATABASE_URL, **engine_kwargs)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# One session per thread, shared by DatabaseService; ScopedSession.remove() releases it
+ScopedSession = scoped_session(SessionLocal)
 Base = declarative_base()
 
+# Table options for MySQL (ignored by other dialects): InnoDB with DYNAMIC rows
+# keeps long TEXT values off-page instead of inflating every row
+MYSQL_TABLE_ARGS = {'mysql_engine': 'InnoDB', 'mysql_row_format': 'DYNAMIC'}
+
 
 class ServiceType(Base):
     """Service type definitions (medical/non-medical)"""
     __tablename__ = 'service_types'
+    __table_args__ = (
+        # Active/medical filter plus the (is_medical, name) ordering of the service lists
+        Index('ix_stype_active_medical_name', 'is_active', 'is_medical', 'name'),
+        MYSQL_TABLE_ARGS
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), unique=True, nullable=False, index=True)
@@ -55,7 +70,7 @@ class ServiceType(Base):
     default_rate = Column(Float, default=0.0)
     billing_method = Column(String(50), default='hourly')  # 'hourly' or 'unit'
     unit_type = Column(String(50), default='hour')  # 'hour' or '15min'
-    description = Column(Text, nullable=True)
+    description = deferred(Column(Text, nullable=True))  # loaded on first access
     created_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
     
@@ -66,12 +81,13 @@ class ServiceType(Base):
 class Client(Base):
     """Client information"""
     __tablename__ = 'clients'
+    __table_args__ = MYSQL_TABLE_ARGS
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), unique=True, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
-    notes = Column(Text, nullable=True)
+    notes = deferred(Column(Text, nullable=True))  # loaded on first access
     
     # Relationships
     service_configs = relationship("ClientServiceConfig", back_populates="client", cascade="all, delete-orphan")
@@ -81,6 +97,11 @@ class Client(Base):
 class ClientServiceConfig(Base):
     """Configuration of services for each client"""
     __tablename__ = 'client_service_configs'
+    __table_args__ = (
+        # get_client_configs filters on client_id and is_active
+        Index('ix_csc_client_active', 'client_id', 'is_active'),
+        MYSQL_TABLE_ARGS
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     client_id = Column(Integer, ForeignKey('clients.id', ondelete='CASCADE'), nullable=False)
@@ -103,6 +124,7 @@ class ClientServiceConfig(Base):
 class PeriodOverride(Base):
     """Temporary adjustments for client services"""
     __tablename__ = 'period_overrides'
+    __table_args__ = MYSQL_TABLE_ARGS
     
     id = Column(Integer, primary_key=True, index=True)
     client_id = Column(Integer, ForeignKey('clients.id', ondelete='CASCADE'), nullable=False)
@@ -110,7 +132,7 @@ class PeriodOverride(Base):
     override_hours = Column(Float, nullable=False)
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=False)
-    reason = Column(String(500), nullable=True)
+    reason = deferred(Column(String(500), nullable=True))  # loaded on first access
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -120,12 +142,13 @@ class PeriodOverride(Base):
 class ConfigHistory(Base):
     """Audit trail for configuration changes"""
     __tablename__ = 'config_history'
+    __table_args__ = MYSQL_TABLE_ARGS
     
     id = Column(Integer, primary_key=True, index=True)
     entity_type = Column(String(100), nullable=False)  # 'service_type', 'client', etc.
     entity_id = Column(Integer, nullable=False)
     action = Column(String(50), nullable=False)  # 'create', 'update', 'delete'
-    changes = Column(Text, nullable=True)  # JSON string of changes
+    changes = deferred(Column(Text, nullable=True))  # JSON string of changes, loaded on first access
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
@@ -136,14 +159,16 @@ class ConfigHistory(Base):
 class ManualEntry(Base):
     """Manual entries for paper-based records"""
     __tablename__ = 'manual_entries'
+    __table_args__ = MYSQL_TABLE_ARGS
     
     id = Column(Integer, primary_key=True, index=True)
-    client_name = Column(String(255), nullable=False, index=True)
+    client_id = Column(Integer, ForeignKey('clients.id', ondelete='SET NULL'), nullable=True, index=True)
+    client_name = Column(String(255), nullable=False, index=True)  # kept for display
     caregiver_name = Column(String(255), nullable=False)
     service_date = Column(DateTime, nullable=False)
     service_type = Column(String(255), nullable=False)
     hours = Column(Float, nullable=False)
-    notes = Column(Text, nullable=True)
+    notes = deferred(Column(Text, nullable=True))  # loaded on first access
     entry_date = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=True)
     
@@ -154,6 +179,7 @@ class ManualEntry(Base):
 class User(Base):
     """User accounts with authentication"""
     __tablename__ = 'users'
+    __table_args__ = MYSQL_TABLE_ARGS
     
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(100), unique=True, nullable=False, index=True)
@@ -173,18 +199,82 @@ class User(Base):
         """Hash and set password"""
         self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
     
+    @property
+    def _password_hash_bytes(self) -> bytes:
+        """password_hash encoded for bcrypt, re-encoded only when the hash changes"""
+        cached = getattr(self, '_pwh_b', None)
+        if cached is None or cached[0] != self.password_hash:
+            cached = (self.password_hash, self.password_hash.encode('utf-8'))
+            self._pwh_b = cached
+        return cached[1]
+    
     def check_password(self, password: str) -> bool:
         """Verify password against hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return bcrypt.checkpw(password.encode('utf-8'), self._password_hash_bytes)
+
+
+def insert_ignore(model, rows: list, conflict_column: str):
+    """
+    Build a multi-row INSERT that skips rows whose conflict_column already exists
+    (ON CONFLICT DO NOTHING on PostgreSQL/SQLite, INSERT IGNORE on MySQL)
+    """
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        return pg_insert(model).values(rows).on_conflict_do_nothing(index_elements=[conflict_column])
+    if dialect == 'sqlite':
+        return sqlite_insert(model).values(rows).on_conflict_do_nothing(index_elements=[conflict_column])
+    if dialect == 'mysql':
+        return mysql_insert(model).values(rows).prefix_with('IGNORE')
+    return insert(model).values(rows)
+
+
+def _migrate_manual_entry_client_id():
+    """
+    Add manual_entries.client_id to databases created before it existed and
+    fill it in from client_name (create_all only creates missing tables)
+    """
+    columns = {column['name'] for column in inspect(engine).get_columns('manual_entries')}
+    with engine.begin() as conn:
+        if 'client_id' not in columns:
+            print("🔧 Adding client_id to manual entries...")
+            conn.execute(text("ALTER TABLE manual_entries ADD COLUMN client_id INTEGER"))
+            conn.execute(text("CREATE INDEX ix_manual_entries_client_id ON manual_entries (client_id)"))
+            conn.execute(text(
+                "UPDATE manual_entries SET client_id = "
+                "(SELECT clients.id FROM clients WHERE clients.name = manual_entries.client_name)"
+            ))
+
+
+def _create_missing_indexes():
+    """Create composite indexes on tables that predate them (create_all skips existing tables)"""
+    for table in (ServiceType.__table__, ClientServiceConfig.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+_db_initialized = False
+_db_init_lock = threading.Lock()
 
 
 def init_db():
-    """Initialize database tables and create default data"""
+    """Initialize database tables and create default data (once per process)"""
+    global _db_initialized
+    with _db_init_lock:
+        if _db_initialized:
+            return
+        _init_db()
+        _db_initialized = True
+
+
+def _init_db():
+    """Create tables, run migrations and seed default data"""
     try:
         print("🔧 Initializing database...")
         
         # Create all tables
         Base.metadata.create_all(bind=engine)
+        _migrate_manual_entry_client_id()
+        _create_missing_indexes()
         print("✅ Database tables created")
         
         # Create session
@@ -192,8 +282,8 @@ def init_db():
         
         try:
             # Check if default user exists
-            existing_user = db.query(User).filter_by(username='Billingpro').first()
-            if not existing_user:
+            user_exists = db.query(db.query(User.id).filter_by(username='Billingpro').exists()).scalar()
+            if not user_exists:
                 print("👤 Creating default user...")
                 default_user = User(
                     username='Billingpro',
@@ -207,43 +297,43 @@ def init_db():
                 db.commit()
                 print("✅ Default user created (Username: Billingpro, Password: Guard2026!)")
             
-            # Check if default service types exist
-            existing_services = db.query(ServiceType).count()
-            if existing_services == 0:
+            # Seed default service types in one statement, only into an empty table
+            services_exist = db.query(db.query(ServiceType.id).exists()).scalar()
+            if not services_exist:
                 print("🏥 Creating default service types...")
                 default_services = [
-                    ServiceType(
-                        name='Home Health - Nursing',
-                        is_medical=True,
-                        default_rate=130.0,
-                        billing_method='hourly',
-                        description='Professional nursing services'
-                    ),
-                    ServiceType(
-                        name='Home Health - Basic',
-                        is_medical=True,
-                        default_rate=41.45,
-                        billing_method='hourly',
-                        description='Basic home health services'
-                    ),
-                    ServiceType(
-                        name='Home Health - Physical Therapy',
-                        is_medical=True,
-                        default_rate=143.0,
-                        billing_method='hourly',
-                        description='Physical therapy services'
-                    ),
-                    ServiceType(
-                        name='Personal Care',
-                        is_medical=False,
-                        default_rate=35.0,
-                        billing_method='hourly',
-                        description='Non-medical personal care'
-                    )
+                    {
+                        'name': 'Home Health - Nursing',
+                        'is_medical': True,
+                        'default_rate': 130.0,
+                        'billing_method': 'hourly',
+                        'description': 'Professional nursing services'
+                    },
+                    {
+                        'name': 'Home Health - Basic',
+                        'is_medical': True,
+                        'default_rate': 41.45,
+                        'billing_method': 'hourly',
+                        'description': 'Basic home health services'
+                    },
+                    {
+                        'name': 'Home Health - Physical Therapy',
+                        'is_medical': True,
+                        'default_rate': 143.0,
+                        'billing_method': 'hourly',
+                        'description': 'Physical therapy services'
+                    },
+                    {
+                        'name': 'Personal Care',
+                        'is_medical': False,
+                        'default_rate': 35.0,
+                        'billing_method': 'hourly',
+                        'description': 'Non-medical personal care'
+                    }
                 ]
-                db.add_all(default_services)
+                result = db.execute(insert_ignore(ServiceType, default_services, 'name'))
                 db.commit()
-                print("✅ Default service types created")
+                print(f"✅ Created {result.rowcount} default service types")
             
             print("✅ Database initialization complete!")
             
@@ -268,12 +358,24 @@ def get_db():
         db.close()
 
 
+def bulk_insert(table, rows: list):
+    """
+    Insert many rows with one executemany through SQLAlchemy Core, skipping the
+    ORM unit of work (e.g. bulk_insert(ConfigHistory.__table__, [dict(...), ...]))
+    """
+    if not rows:
+        return
+    with engine.begin() as conn:
+        conn.execute(table.insert(), rows)
+
+
 def test_connection():
     """Test database connection"""
     try:
-        db = SessionLocal()
-        db.execute("SELECT 1")
-        db.close()
+        # A plain pooled connection is enough for a ping, and the context
+        # manager returns it to the pool even if the query fails
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
         print("✅ Database connection successful")
         return True
     except Exception as e:
@@ -287,15 +389,28 @@ def close_db(db=None):
 
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
-    import bcrypt
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
 
 def verify_password(password: str, hashed: str) -> bool:
     """Verify a password against a hash"""
-    import bcrypt
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+
+_DUMMY_PASSWORD_HASH = None
+
+
+def dummy_password_check(password: str) -> bool:
+    """
+    Spend the same bcrypt time as a real check and return False, so a login for an
+    unknown or inactive user can't be told apart by how long it takes
+    """
+    global _DUMMY_PASSWORD_HASH
+    if _DUMMY_PASSWORD_HASH is None:
+        _DUMMY_PASSWORD_HASH = bcrypt.hashpw(b'not-a-real-password', bcrypt.gensalt())
+    bcrypt.checkpw(password.encode('utf-8'), _DUMMY_PASSWORD_HASH)
+    return False
+
 if __name__ == "__main__":
     # Test configuration and connection
     Config.print_config_info()
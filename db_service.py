@@ -1,38 +1,203 @@
 """Database service layer for managing service types and client configurations"""
-import json
+import atexit
+import queue
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from typing import List, Dict, Optional, Any, Callable, Set, Tuple
+import orjson
+from sqlalchemy.orm import Session, joinedload, selectinload, undefer
+from sqlalchemy import and_, bindparam, exists, or_, select, text, update
+from sqlalchemy.exc import OperationalError
 from database import (
-    SessionLocal, ServiceType, Client, ClientServiceConfig, 
-    PeriodOverride, ConfigHistory, ManualEntry, User
+    engine, ScopedSession, ServiceType, Client, ClientServiceConfig, 
+    PeriodOverride, ConfigHistory, ManualEntry, User, insert_ignore, dummy_password_check
 )
 
+# Single-row lookups built once at import; SQLAlchemy's compiled cache then
+# reuses the same SQL on every call and only the bound parameter changes
+_SERVICE_TYPE_BY_NAME = select(ServiceType).where(ServiceType.name == bindparam('name')).limit(1)
+_SERVICE_TYPE_BY_ID = select(ServiceType).where(ServiceType.id == bindparam('id')).limit(1)
+_CLIENT_BY_NAME = select(Client).where(Client.name == bindparam('name')).limit(1)
+_ACTIVE_CLIENT_CONFIG = select(ClientServiceConfig).where(
+    ClientServiceConfig.client_id == bindparam('client_id'),
+    ClientServiceConfig.service_type_id == bindparam('service_type_id'),
+    ClientServiceConfig.is_active == True
+).limit(1)
+_MANUAL_ENTRY_BY_ID = select(ManualEntry).where(ManualEntry.id == bindparam('id')).limit(1)
+_USER_BY_USERNAME = select(User).where(User.username == bindparam('username')).limit(1)
+
+# last_login stamps are written in batches by one background thread: one
+# executemany UPDATE per LAST_LOGIN_FLUSH_INTERVAL instead of a commit per login
+LAST_LOGIN_FLUSH_INTERVAL = 1.0
+_UPDATE_LAST_LOGIN = update(User.__table__).where(User.__table__.c.id == bindparam('uid')).values(
+    last_login=bindparam('ts')
+)
+_last_login_queue: "queue.Queue[Tuple[int, datetime]]" = queue.Queue()
+_last_login_writer: Optional[threading.Thread] = None
+_last_login_writer_lock = threading.Lock()
+
+# Existence check answered by the database as SELECT EXISTS(...), without loading a row
+_SERVICE_TYPE_EXISTS = select(exists().where(ServiceType.name == bindparam('name')))
+
+# How long clear_all_manual_entries waits for TRUNCATE's table lock on PostgreSQL
+TRUNCATE_LOCK_TIMEOUT = '2s'
+
+# Seconds a cached service type read is reused before going back to the database
+SERVICE_CACHE_TTL = 60.0
+
+# After this many failed logins for a username from one client within the window,
+# further attempts from that client are rejected without running bcrypt until the
+# window passes; other clients can still log in as the same user
+MAX_FAILED_LOGINS = 5
+FAILED_LOGIN_WINDOW = 300.0
+
+# (username, client) -> (time of first failure in the window, failure count); shared by
+# all sessions and kept in first-failure order, so expired entries sit at the front
+_failed_logins: "OrderedDict[Tuple[str, str], Tuple[float, int]]" = OrderedDict()
+_failed_logins_lock = threading.Lock()
+
+
+def _login_retry_after(username: str, client: str) -> float:
+    """Seconds until username may be tried again from client (0 if not locked out)"""
+    key = (username, client)
+    with _failed_logins_lock:
+        entry = _failed_logins.get(key)
+        if entry is None:
+            return 0.0
+        elapsed = time.monotonic() - entry[0]
+        if elapsed >= FAILED_LOGIN_WINDOW:
+            del _failed_logins[key]
+            return 0.0
+        return FAILED_LOGIN_WINDOW - elapsed if entry[1] >= MAX_FAILED_LOGINS else 0.0
+
+
+def _record_login_result(username: str, client: str, success: bool):
+    """Count a failed login (or forget past failures after a successful one)"""
+    key = (username, client)
+    now = time.monotonic()
+    with _failed_logins_lock:
+        if success:
+            _failed_logins.pop(key, None)
+            return
+        # Drop expired entries from the front so the table stays bounded by the window
+        while _failed_logins:
+            oldest_key, (start, _) = next(iter(_failed_logins.items()))
+            if now - start < FAILED_LOGIN_WINDOW:
+                break
+            del _failed_logins[oldest_key]
+        first, count = _failed_logins.get(key, (now, 0))
+        _failed_logins[key] = (first, count + 1)
+        if count == 0:
+            _failed_logins.move_to_end(key)
+
+
+def _flush_last_logins():
+    """Write every queued last_login stamp (latest per user) in a single executemany"""
+    latest: Dict[int, datetime] = {}
+    while True:
+        try:
+            user_id, ts = _last_login_queue.get_nowait()
+        except queue.Empty:
+            break
+        latest[user_id] = max(ts, latest.get(user_id, ts))
+    if not latest:
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(_UPDATE_LAST_LOGIN, [{'uid': uid, 'ts': ts} for uid, ts in latest.items()])
+    except Exception as e:
+        print(f"Error recording last login: {e}")
+
+
+def _last_login_writer_loop():
+    """Background thread body: flush queued last_login stamps every LAST_LOGIN_FLUSH_INTERVAL seconds"""
+    while True:
+        time.sleep(LAST_LOGIN_FLUSH_INTERVAL)
+        _flush_last_logins()
+
+
+def _queue_last_login(user_id: int, ts: datetime):
+    """Queue a last_login stamp, starting the background writer on first use"""
+    global _last_login_writer
+    _last_login_queue.put((user_id, ts))
+    if _last_login_writer is None:
+        with _last_login_writer_lock:
+            if _last_login_writer is None:
+                _last_login_writer = threading.Thread(target=_last_login_writer_loop, name='last-login-writer', daemon=True)
+                _last_login_writer.start()
+                # Don't drop stamps still waiting in the queue at interpreter exit
+                atexit.register(_flush_last_logins)
+
+
 class DatabaseService:
     """Service layer for database operations"""
     
     def __init__(self):
-        self.db = None
+        # (method, args...) -> (time loaded, value); cleared on any service type write
+        self._svc_cache: Dict[tuple, Tuple[float, Any]] = {}
+        # Every thread session handed out by get_session(), so close_session() can
+        # also release sessions left behind by earlier script runs (Streamlit runs
+        # each rerun on a new thread, and thread-local sessions are never closed by GC)
+        self._open_sessions: Set[Session] = set()
+        self._open_sessions_lock = threading.Lock()
+    
+    def _cached(self, key: tuple, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key if younger than SERVICE_CACHE_TTL, else reload it"""
+        now = time.monotonic()
+        hit = self._svc_cache.get(key)
+        if hit is not None and now - hit[0] < SERVICE_CACHE_TTL:
+            return hit[1]
+        value = loader()
+        self._svc_cache[key] = (now, value)
+        return value
+    
+    def _invalidate_service_cache(self):
+        """Drop cached service type reads after a service type changes"""
+        self._svc_cache.clear()
     
     def get_session(self) -> Session:
-        """Get or create database session"""
-        if not self.db:
-            self.db = SessionLocal()
-        return self.db
+        """Get the current thread's database session (created on first use)"""
+        db = ScopedSession()
+        with self._open_sessions_lock:
+            self._open_sessions.add(db)
+        return db
+    
+    @contextmanager
+    def session_scope(self):
+        """
+        Unit of work on the thread's session: commits when the block finishes,
+        rolls back if it raises. The session stays open afterwards so returned
+        objects can still load lazy attributes; close_session() releases it.
+        """
+        db = self.get_session()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
     
     def close_session(self):
-        """Close database session"""
-        if self.db:
-            self.db.close()
-            self.db = None
+        """
+        Close every session this service has handed out, including those of
+        finished script threads, and return their connections to the pool
+        """
+        with self._open_sessions_lock:
+            sessions = list(self._open_sessions)
+            self._open_sessions.clear()
+        for db in sessions:
+            db.close()
+        ScopedSession.remove()
     
     # ===== SERVICE TYPE OPERATIONS =====
     
     def get_all_service_types(self, active_only=True) -> List[ServiceType]:
-        """Get all service types"""
+        """Get all service types (description included, the service pages list it)"""
         db = self.get_session()
-        query = db.query(ServiceType)
+        query = db.query(ServiceType).options(undefer(ServiceType.description))
         if active_only:
             query = query.filter(ServiceType.is_active == True)
         return query.order_by(ServiceType.is_medical.desc(), ServiceType.name).all()
@@ -40,49 +205,54 @@ class DatabaseService:
     def get_service_type_by_name(self, name: str) -> Optional[ServiceType]:
         """Get service type by name"""
         db = self.get_session()
-        return db.query(ServiceType).filter(ServiceType.name == name).first()
+        return db.execute(_SERVICE_TYPE_BY_NAME, {'name': name}).scalars().first()
+    
+    def service_type_exists(self, name: str) -> bool:
+        """Check whether a service type with this name exists"""
+        db = self.get_session()
+        return db.execute(_SERVICE_TYPE_EXISTS, {'name': name}).scalar()
     
     def create_service_type(self, name: str, is_medical: bool, default_rate: float,
                            billing_method: str = 'hourly', unit_type: str = 'hour',
                            description: str = None) -> ServiceType:
         """Create a new service type"""
-        db = self.get_session()
-        service_type = ServiceType(
-            name=name,
-            is_medical=is_medical,
-            default_rate=default_rate,
-            billing_method=billing_method,
-            unit_type=unit_type,
-            description=description
-        )
-        db.add(service_type)
-        db.commit()
+        with self.session_scope() as db:
+            service_type = ServiceType(
+                name=name,
+                is_medical=is_medical,
+                default_rate=default_rate,
+                billing_method=billing_method,
+                unit_type=unit_type,
+                description=description
+            )
+            db.add(service_type)
+        self._invalidate_service_cache()
         db.refresh(service_type)
         return service_type
     
     def update_service_type(self, service_id: int, **kwargs) -> ServiceType:
         """Update a service type"""
-        db = self.get_session()
-        service_type = db.query(ServiceType).filter(ServiceType.id == service_id).first()
+        with self.session_scope() as db:
+            service_type = db.execute(_SERVICE_TYPE_BY_ID, {'id': service_id}).scalars().first()
+            if service_type:
+                for key, value in kwargs.items():
+                    if hasattr(service_type, key):
+                        setattr(service_type, key, value)
+        self._invalidate_service_cache()
         if service_type:
-            for key, value in kwargs.items():
-                if hasattr(service_type, key):
-                    setattr(service_type, key, value)
-            db.commit()
             db.refresh(service_type)
         return service_type
     
     def delete_service_type(self, service_id: int, soft_delete: bool = True):
         """Delete a service type (soft or hard delete)"""
-        db = self.get_session()
-        service_type = db.query(ServiceType).filter(ServiceType.id == service_id).first()
-        if service_type:
-            if soft_delete:
-                service_type.is_active = False
-                db.commit()
-            else:
-                db.delete(service_type)
-                db.commit()
+        with self.session_scope() as db:
+            service_type = db.execute(_SERVICE_TYPE_BY_ID, {'id': service_id}).scalars().first()
+            if service_type:
+                if soft_delete:
+                    service_type.is_active = False
+                else:
+                    db.delete(service_type)
+        self._invalidate_service_cache()
     
     # ===== CLIENT OPERATIONS =====
     
@@ -94,36 +264,57 @@ class DatabaseService:
             query = query.filter(Client.is_active == True)
         return query.order_by(Client.name).all()
     
+    def get_client_names(self, active_only=True) -> List[str]:
+        """Get client names in name order (selects only the name column)"""
+        db = self.get_session()
+        stmt = select(Client.name)
+        if active_only:
+            stmt = stmt.where(Client.is_active == True)
+        return db.execute(stmt.order_by(Client.name)).scalars().all()
+    
     def get_client_by_name(self, name: str) -> Optional[Client]:
         """Get client by name"""
         db = self.get_session()
-        return db.query(Client).filter(Client.name == name).first()
+        return db.execute(_CLIENT_BY_NAME, {'name': name}).scalars().first()
     
     def create_client(self, name: str, notes: str = None) -> Client:
         """Create a new client"""
-        db = self.get_session()
-        client = Client(name=name, notes=notes)
-        db.add(client)
-        db.commit()
+        with self.session_scope() as db:
+            client = Client(name=name, notes=notes)
+            db.add(client)
         db.refresh(client)
         return client
     
+    def _upsert_client(self, name: str, notes: str = None) -> Client:
+        """
+        Return the client with this name, inserting it first if it is new (INSERT ...
+        ON CONFLICT DO NOTHING, so concurrent callers can't both create it)
+        """
+        client = self.get_client_by_name(name)
+        if client is not None:
+            return client
+        with self.session_scope() as db:
+            db.execute(insert_ignore(Client, [{'name': name, 'notes': notes}], 'name'))
+        return db.execute(_CLIENT_BY_NAME, {'name': name}).scalar_one()
+    
     def get_or_create_client(self, name: str) -> Client:
         """Get existing client or create new one"""
-        client = self.get_client_by_name(name)
-        if not client:
-            client = self.create_client(name)
-        return client
+        return self._upsert_client(name)
     
     # ===== CLIENT SERVICE CONFIG OPERATIONS =====
     
     def get_client_configs(self, client_name: str) -> List[ClientServiceConfig]:
-        """Get all service configurations for a client"""
+        """Get all service configurations for a client (service type and client loaded up front)"""
         db = self.get_session()
         client = self.get_client_by_name(client_name)
         if not client:
             return []
-        return db.query(ClientServiceConfig).filter(
+        # Callers read config.service_type for every row; load them all in one
+        # extra IN query instead of one lazy SELECT per config
+        return db.query(ClientServiceConfig).options(
+            selectinload(ClientServiceConfig.service_type),
+            joinedload(ClientServiceConfig.client)
+        ).filter(
             and_(
                 ClientServiceConfig.client_id == client.id,
                 ClientServiceConfig.is_active == True
@@ -134,49 +325,40 @@ class DatabaseService:
                             default_hours: float, custom_rate: float = None,
                             billing_method: str = 'hourly', unit_type: str = 'hour') -> ClientServiceConfig:
         """Create a new client service configuration"""
-        db = self.get_session()
-        
         # Get or create client
-        client = self.get_or_create_client(client_name)
+        client = self._upsert_client(client_name)
         
         # Get service type
         service_type = self.get_service_type_by_name(service_type_name)
         if not service_type:
             raise ValueError(f"Service type '{service_type_name}' not found")
         
-        # Check if config already exists
-        existing = db.query(ClientServiceConfig).filter(
-            and_(
-                ClientServiceConfig.client_id == client.id,
-                ClientServiceConfig.service_type_id == service_type.id,
-                ClientServiceConfig.is_active == True
-            )
-        ).first()
-        
-        if existing:
-            # Update existing config
-            existing.default_hours = default_hours
-            existing.custom_rate = custom_rate
-            existing.billing_method = billing_method
-            existing.unit_type = unit_type
-            existing.updated_at = datetime.utcnow()
-            db.commit()
-            db.refresh(existing)
-            return existing
-        else:
-            # Create new config
-            config = ClientServiceConfig(
-                client_id=client.id,
-                service_type_id=service_type.id,
-                default_hours=default_hours,
-                custom_rate=custom_rate,
-                billing_method=billing_method,
-                unit_type=unit_type
-            )
-            db.add(config)
-            db.commit()
-            db.refresh(config)
-            return config
+        with self.session_scope() as db:
+            # Check if config already exists
+            config = db.execute(
+                _ACTIVE_CLIENT_CONFIG, {'client_id': client.id, 'service_type_id': service_type.id}
+            ).scalars().first()
+            
+            if config:
+                # Update existing config
+                config.default_hours = default_hours
+                config.custom_rate = custom_rate
+                config.billing_method = billing_method
+                config.unit_type = unit_type
+                config.updated_at = datetime.utcnow()
+            else:
+                # Create new config
+                config = ClientServiceConfig(
+                    client_id=client.id,
+                    service_type_id=service_type.id,
+                    default_hours=default_hours,
+                    custom_rate=custom_rate,
+                    billing_method=billing_method,
+                    unit_type=unit_type
+                )
+                db.add(config)
+        db.refresh(config)
+        return config
     
     def get_service_rate(self, service_type_name: str) -> Dict[str, Any]:
         """Get service rate information"""
@@ -196,60 +378,88 @@ class DatabaseService:
         }
     
     def get_all_service_rates(self) -> Dict[str, Dict[str, Any]]:
-        """Get all service rates as a dictionary"""
-        service_types = self.get_all_service_types()
-        return {
+        """Get all service rates as a dictionary (cached for SERVICE_CACHE_TTL; treat as read-only)"""
+        return self._cached(('service_rates',), lambda: {
             st.name: {
                 'rate': st.default_rate,
                 'billing_method': st.billing_method,
                 'unit': st.unit_type,
                 'is_medical': st.is_medical
             }
-            for st in service_types
-        }
+            for st in self.get_all_service_types()
+        })
     
     def update_service_rate(self, service_type_name: str, rate: float):
         """Update service type rate"""
-        db = self.get_session()
-        service_type = self.get_service_type_by_name(service_type_name)
-        if service_type:
-            service_type.default_rate = rate
-            db.commit()
+        with self.session_scope():
+            service_type = self.get_service_type_by_name(service_type_name)
+            if service_type:
+                service_type.default_rate = rate
+        self._invalidate_service_cache()
     
     def get_service_type_names(self, medical_only=False, non_medical_only=False) -> List[str]:
-        """Get list of service type names"""
+        """Get list of service type names (selects only the name column; cached, treat as read-only)"""
+        return self._cached(('service_type_names', medical_only, non_medical_only),
+                            lambda: self._load_service_type_names(medical_only, non_medical_only))
+    
+    def _load_service_type_names(self, medical_only: bool, non_medical_only: bool) -> List[str]:
+        """Query the active service type names, medical first"""
         db = self.get_session()
-        query = db.query(ServiceType).filter(ServiceType.is_active == True)
+        stmt = select(ServiceType.name).where(ServiceType.is_active == True)
         
         if medical_only:
-            query = query.filter(ServiceType.is_medical == True)
+            stmt = stmt.where(ServiceType.is_medical == True)
         elif non_medical_only:
-            query = query.filter(ServiceType.is_medical == False)
+            stmt = stmt.where(ServiceType.is_medical == False)
         
-        service_types = query.order_by(ServiceType.is_medical.desc(), ServiceType.name).all()
-        return [st.name for st in service_types]
+        return db.execute(stmt.order_by(ServiceType.is_medical.desc(), ServiceType.name)).scalars().all()
     
     # ===== MIGRATION HELPERS =====
     
     def migrate_from_json(self, json_file_path: str):
-        """Migrate client data from JSON file to database"""
+        """Migrate client data from JSON file to database (one transaction for the whole file)"""
         try:
-            with open(json_file_path, 'r') as f:
-                data = json.load(f)
+            with open(json_file_path, 'rb') as f:
+                data = orjson.loads(f.read())
             
-            for client_name, services in data.items():
-                for service_name, config in services.items():
-                    try:
-                        self.create_client_config(
-                            client_name=client_name,
-                            service_type_name=service_name,
-                            default_hours=config.get('default_hours', 0.0),
-                            custom_rate=config.get('rate'),
-                            billing_method=config.get('billing_method', 'hourly'),
-                            unit_type=config.get('unit', 'hour')
-                        )
-                    except Exception as e:
-                        print(f"Error migrating {client_name} - {service_name}: {e}")
+            with self.session_scope() as db:
+                # Create any missing clients in one statement, then preload the
+                # name -> id maps and the configs that already exist
+                if data:
+                    db.execute(insert_ignore(Client, [{'name': name} for name in data], 'name'))
+                client_ids = dict(db.query(Client.name, Client.id).filter(Client.name.in_(list(data))).all())
+                service_type_ids = dict(db.query(ServiceType.name, ServiceType.id).all())
+                existing = {
+                    (client_id, service_type_id): config_id
+                    for config_id, client_id, service_type_id in db.query(
+                        ClientServiceConfig.id, ClientServiceConfig.client_id, ClientServiceConfig.service_type_id
+                    ).filter(ClientServiceConfig.is_active == True).all()
+                }
+                
+                to_insert = []
+                to_update = []
+                now = datetime.utcnow()
+                for client_name, services in data.items():
+                    for service_name, config in services.items():
+                        service_type_id = service_type_ids.get(service_name)
+                        if service_type_id is None:
+                            print(f"Error migrating {client_name} - {service_name}: Service type '{service_name}' not found")
+                            continue
+                        
+                        values = {
+                            'default_hours': config.get('default_hours', 0.0),
+                            'custom_rate': config.get('rate'),
+                            'billing_method': config.get('billing_method', 'hourly'),
+                            'unit_type': config.get('unit', 'hour')
+                        }
+                        key = (client_ids[client_name], service_type_id)
+                        if key in existing:
+                            to_update.append({'id': existing[key], 'updated_at': now, **values})
+                        else:
+                            to_insert.append({'client_id': key[0], 'service_type_id': key[1], **values})
+                
+                db.bulk_insert_mappings(ClientServiceConfig, to_insert)
+                db.bulk_update_mappings(ClientServiceConfig, to_update)
         except FileNotFoundError:
             print(f"JSON file not found: {json_file_path}")
         except Exception as e:
@@ -261,86 +471,110 @@ class DatabaseService:
                            service_date: datetime, service_type: str,
                            hours: float, notes: str = None) -> ManualEntry:
         """Create a new manual entry and ensure client exists in Client table"""
-        db = self.get_session()
-        
         # Ensure client exists in Client table
-        client = self.get_client_by_name(client_name)
-        if not client:
-            client = self.create_client(client_name, notes=f"Auto-created from manual entry")
+        client = self._upsert_client(client_name, notes="Auto-created from manual entry")
         
         # Create manual entry
-        entry = ManualEntry(
-            client_name=client_name,
-            caregiver_name=caregiver_name,
-            service_date=service_date,
-            service_type=service_type,
-            hours=hours,
-            notes=notes
-        )
-        db.add(entry)
-        db.commit()
+        with self.session_scope() as db:
+            entry = ManualEntry(
+                client_id=client.id,
+                client_name=client_name,
+                caregiver_name=caregiver_name,
+                service_date=service_date,
+                service_type=service_type,
+                hours=hours,
+                notes=notes
+            )
+            db.add(entry)
         db.refresh(entry)
         return entry
     
     def get_all_manual_entries(self) -> List[ManualEntry]:
-        """Get all manual entries"""
+        """Get all manual entries (notes included, the entries table shows them)"""
         db = self.get_session()
-        return db.query(ManualEntry).order_by(ManualEntry.entry_date.desc()).all()
+        return db.query(ManualEntry).options(undefer(ManualEntry.notes)).order_by(ManualEntry.entry_date.desc()).all()
     
     def get_manual_entries_by_client(self, client_name: str) -> List[ManualEntry]:
-        """Get manual entries for a specific client"""
+        """Get manual entries for a specific client (by client_id, falling back to client_name)"""
         db = self.get_session()
-        return db.query(ManualEntry).filter(ManualEntry.client_name == client_name).all()
+        # Entries the backfill couldn't link, or whose client row was deleted, only
+        # carry the name
+        unlinked = and_(
+            ManualEntry.client_name == client_name,
+            ~exists().where(Client.id == ManualEntry.client_id)
+        )
+        client = db.execute(_CLIENT_BY_NAME, {'name': client_name}).scalars().first()
+        if client is None:
+            return db.query(ManualEntry).filter(unlinked).all()
+        return db.query(ManualEntry).filter(or_(ManualEntry.client_id == client.id, unlinked)).all()
     
     def delete_manual_entry(self, entry_id: int):
         """Delete a manual entry"""
-        db = self.get_session()
-        entry = db.query(ManualEntry).filter(ManualEntry.id == entry_id).first()
-        if entry:
-            db.delete(entry)
-            db.commit()
+        with self.session_scope() as db:
+            entry = db.execute(_MANUAL_ENTRY_BY_ID, {'id': entry_id}).scalars().first()
+            if entry:
+                db.delete(entry)
     
     def clear_all_manual_entries(self):
         """Delete all manual entries"""
-        db = self.get_session()
-        db.query(ManualEntry).delete()
-        db.commit()
+        with self.session_scope() as db:
+            if db.bind.dialect.name == 'postgresql':
+                # TRUNCATE drops the table's pages at once instead of deleting row by row,
+                # but needs an ACCESS EXCLUSIVE lock. A session left idle in a transaction
+                # would block it, and every reader would queue behind it, so give up after
+                # TRUNCATE_LOCK_TIMEOUT and fall back to the DELETE below
+                try:
+                    with db.begin_nested():
+                        db.execute(text(f"SET LOCAL lock_timeout = '{TRUNCATE_LOCK_TIMEOUT}'"))
+                        db.execute(text(f'TRUNCATE {ManualEntry.__tablename__} RESTART IDENTITY'))
+                    return
+                except OperationalError as e:
+                    print(f"TRUNCATE of manual entries timed out, deleting instead: {e}")
+            # One bulk DELETE; loaded entries are not tracked down in the session
+            db.query(ManualEntry).delete(synchronize_session=False)
     
     # ===== USER AUTHENTICATION OPERATIONS =====
     
-    def authenticate_user(self, username: str, password: str) -> Optional[User]:
-        """Authenticate user with username and password"""
-        from database import SessionLocal, User
+    def login_retry_after(self, username: str, client: str = '') -> float:
+        """Seconds until username may be tried again from client (0 if not locked out)"""
+        return _login_retry_after(username, client)
+    
+    def authenticate_user(self, username: str, password: str, client: str = '') -> Optional[User]:
+        """Authenticate user with username and password; client identifies the caller for throttling"""
+        # Too many recent failures for this name from this client: reject without paying for bcrypt
+        if _login_retry_after(username, client):
+            return None
         
-        db = SessionLocal()
+        db = self.get_session()
         try:
-            user = db.query(User).filter(User.username == username).first()
+            user = db.execute(_USER_BY_USERNAME, {'username': username}).scalars().first()
             
-            if not user:
+            # Unknown and inactive users still run a (dummy) bcrypt check so
+            # response time doesn't reveal which usernames exist
+            if not user or not user.is_active:
+                dummy_password_check(password)
+                _record_login_result(username, client, False)
                 return None
             
-            if not user.is_active:
+            if not user.check_password(password):
+                _record_login_result(username, client, False)
                 return None
             
-            if user.check_password(password):
-                # Update last login time
-                user.last_login = datetime.utcnow()
-                db.commit()
-                db.refresh(user)
-                
-                # Expunge user from session before closing; detach it
-                db.expunge(user)
-                
-                return user
+            _record_login_result(username, client, True)
             
-            return None
+            # Expunge user from the shared session; callers keep it detached
+            db.expunge(user)
+            
+            # Update last login time; the database write is batched in the background
+            user.last_login = datetime.utcnow()
+            _queue_last_login(user.id, user.last_login)
+            
+            return user
             
         except Exception as e:
             print(f"Authentication error: {e}")
             db.rollback()
             return None
-        finally:
-            db.close()
     
     def get_all_users(self) -> List[User]:
         """Get all users"""
@@ -350,24 +584,20 @@ class DatabaseService:
     def get_user_by_username(self, username: str) -> Optional[User]:
         """Get user by username"""
         db = self.get_session()
-        return db.query(User).filter(User.username == username).first()
+        return db.execute(_USER_BY_USERNAME, {'username': username}).scalars().first()
     
     def update_user_password(self, username: str, new_password: str) -> bool:
         """Update user password"""
-        db = self.get_session()
-        user = db.query(User).filter(User.username == username).first()
-        if user:
-            user.set_password(new_password)
-            db.commit()
-            return True
-        return False
+        with self.session_scope() as db:
+            user = db.execute(_USER_BY_USERNAME, {'username': username}).scalars().first()
+            if user:
+                user.set_password(new_password)
+        return user is not None
     
     def deactivate_user(self, username: str) -> bool:
         """Deactivate a user"""
-        db = self.get_session()
-        user = db.query(User).filter(User.username == username).first()
-        if user:
-            user.is_active = False
-            db.commit()
-            return True
-        return False
+        with self.session_scope() as db:
+            user = db.execute(_USER_BY_USERNAME, {'username': username}).scalars().first()
+            if user:
+                user.is_active = False
+        return user is not None
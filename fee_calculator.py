@@ -1,5 +1,6 @@
 import pandas as pd
-import json
+import numpy as np
+import orjson
 import os
 from typing import Dict, Any
 
@@ -9,16 +10,17 @@ class FeeCalculator:
     def __init__(self, rates_file: str = 'service_rates.json'):
         self.rates_file = rates_file
         self.service_rates = self._load_service_rates()
+        self._rebuild_index()
     
     def _load_service_rates(self) -> Dict[str, Any]:
         """Load service rates from JSON file with support for different billing methods."""
         if os.path.exists(self.rates_file):
             try:
-                with open(self.rates_file, 'r') as f:
-                    rates = json.load(f)
+                with open(self.rates_file, 'rb') as f:
+                    rates = orjson.loads(f.read())
                     # Convert old format to new format if needed
                     return self._convert_to_new_format(rates)
-            except (json.JSONDecodeError, IOError):
+            except (orjson.JSONDecodeError, IOError):
                 return self._get_default_rates()
         return self._get_default_rates()
     
@@ -45,6 +47,22 @@ class FeeCalculator:
                 new_rates[service] = rate
         return new_rates
     
+    def _rebuild_index(self):
+        """
+        Rebuild the column-wise copy of service_rates used by calculate_fees:
+        parallel name/rate arrays and a name -> position map.
+        Must be called whenever service_rates changes.
+        """
+        self._names = list(self.service_rates)
+        self._name_to_idx = {name: i for i, name in enumerate(self._names)}
+        entries = [self.service_rates[name] for name in self._names]
+        rates = np.fromiter(
+            (entry.get('rate', 0.0) if isinstance(entry, dict) else (entry or 0.0) for entry in entries),
+            dtype=np.float64, count=len(entries)
+        )
+        # One trailing 0.0 so unknown services (position -1) take a zero rate
+        self._rate_arr = np.append(rates, 0.0)
+    
     def _get_default_rates(self) -> Dict[str, Any]:
         """Get default service rates with new format."""
         return {
@@ -57,9 +75,13 @@ class FeeCalculator:
     
     def _save_service_rates(self):
         """Save service rates to JSON file."""
+        # Write a temp file and rename it over the target so a crash mid-write
+        # never leaves truncated rates behind
+        tmp_file = f"{self.rates_file}.tmp.{os.getpid()}"
         try:
-            with open(self.rates_file, 'w') as f:
-                json.dump(self.service_rates, f, indent=2)
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(self.service_rates, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_file, self.rates_file)
         except IOError:
             pass  # Silently fail if unable to save
     
@@ -70,11 +92,13 @@ class FeeCalculator:
     def update_service_rates(self, new_rates: Dict[str, float]):
         """Update service rates with new values."""
         self.service_rates.update(new_rates)
+        self._rebuild_index()
         self._save_service_rates()
     
     def set_service_rate(self, service: str, rate: float):
         """Set rate for a specific service."""
         self.service_rates[service] = rate
+        self._rebuild_index()
         self._save_service_rates()
     
     def calculate_fees(self, service_analysis: pd.DataFrame) -> pd.DataFrame:
@@ -90,26 +114,21 @@ class FeeCalculator:
         if service_analysis.empty or not self.service_rates:
             return pd.DataFrame()
         
-        # Create fee calculation DataFrame
-        fee_data = []
-        
-        for service, row in service_analysis.iterrows():
-            count = row['count']
-            rate_data = self.service_rates.get(service, {})
-            if isinstance(rate_data, dict):
-                rate = rate_data.get('rate', 0.0)
-            else:
-                rate = rate_data if rate_data else 0.0
-            total_fee = count * rate
-            
-            fee_data.append({
-                'service': service,
-                'count': count,
-                'rate_per_service': rate,
-                'total_fee': total_fee
-            })
+        # Look up every service's rate in the prebuilt rate array instead of a
+        # Python loop over rows; services without a rate get 0.0
+        positions = np.fromiter(
+            (self._name_to_idx.get(service, -1) for service in service_analysis.index),
+            dtype=np.intp, count=len(service_analysis)
+        )
+        counts = service_analysis['count'].to_numpy()
+        rate_per_service = np.take(self._rate_arr, positions)
         
-        fee_df = pd.DataFrame(fee_data)
+        fee_df = pd.DataFrame({
+            'service': service_analysis.index,
+            'count': counts,
+            'rate_per_service': rate_per_service,
+            'total_fee': counts * rate_per_service
+        })
         
         # Sort by total fee descending
         fee_df = fee_df.sort_values('total_fee', ascending=False)
@@ -135,17 +154,19 @@ class FeeCalculator:
                 'services_without_rates': len(service_analysis)
             }
         
-        # Count services with and without rates
-        services_with_rates = len(fee_df[fee_df['rate_per_service'] > 0])
-        services_without_rates = len(fee_df[fee_df['rate_per_service'] == 0])
+        # One NumPy pass per statistic over the raw arrays
+        total_fees = fee_df['total_fee'].to_numpy()
+        rates = fee_df['rate_per_service'].to_numpy()
+        services = fee_df['service'].to_numpy()
+        total = total_fees.sum()
         
         summary = {
-            'total_fees': fee_df['total_fee'].sum(),
-            'average_fee_per_service': fee_df['total_fee'].mean(),
-            'highest_fee_service': fee_df.loc[fee_df['total_fee'].idxmax(), 'service'] if not fee_df.empty else None,
-            'lowest_fee_service': fee_df.loc[fee_df['total_fee'].idxmin(), 'service'] if not fee_df.empty else None,
-            'services_with_rates': services_with_rates,
-            'services_without_rates': services_without_rates
+            'total_fees': total,
+            'average_fee_per_service': total / len(total_fees),
+            'highest_fee_service': services[total_fees.argmax()],
+            'lowest_fee_service': services[total_fees.argmin()],
+            'services_with_rates': int((rates > 0).sum()),
+            'services_without_rates': int((rates == 0).sum())
         }
         
         return summary
@@ -1,12 +1,32 @@
+import re
 import pandas as pd
-import io
-from typing import Any
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from typing import Any, Optional
+
+# Patterns used by clean_column_name, compiled once at import
+_RE_NON_WORD = re.compile(r'[^\w\s]')
+_RE_WHITESPACE = re.compile(r'\s+')
+_RE_UNDERSCORES = re.compile(r'_+')
 
 def export_to_csv(df: pd.DataFrame) -> str:
     """Convert DataFrame to CSV string for download."""
-    output = io.StringIO()
-    df.to_csv(output, index=False)
-    return output.getvalue()
+    return df.to_csv(index=False)
+
+def export_to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """Convert DataFrame to UTF-8 CSV bytes with PyArrow's multi-threaded writer."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    buffer = pa.BufferOutputStream()
+    pacsv.write_csv(table, buffer)
+    return buffer.getvalue().to_pybytes()
+
+def export_to_parquet(df: pd.DataFrame, compression: str = 'zstd') -> bytes:
+    """Convert DataFrame to Parquet bytes (zstd-compressed) for analytics consumers."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    buffer = pa.BufferOutputStream()
+    pq.write_table(table, buffer, compression=compression)
+    return buffer.getvalue().to_pybytes()
 
 def format_currency(amount: float, currency_symbol: str = "$") -> str:
     """Format a number as currency."""
@@ -38,12 +58,11 @@ def clean_column_name(column_name: str) -> str:
     cleaned = str(column_name).strip().lower()
     
     # Replace spaces and special characters with underscores
-    import re
-    cleaned = re.sub(r'[^\w\s]', '_', cleaned)
-    cleaned = re.sub(r'\s+', '_', cleaned)
+    cleaned = _RE_NON_WORD.sub('_', cleaned)
+    cleaned = _RE_WHITESPACE.sub('_', cleaned)
     
     # Remove multiple consecutive underscores
-    cleaned = re.sub(r'_+', '_', cleaned)
+    cleaned = _RE_UNDERSCORES.sub('_', cleaned)
     
     # Remove leading/trailing underscores
     cleaned = cleaned.strip('_')
@@ -60,14 +79,22 @@ def get_file_size_mb(file_obj: Any) -> float:
     except:
         return 0.0
 
-def create_summary_stats(df: pd.DataFrame) -> dict:
-    """Create summary statistics for a DataFrame."""
+def create_summary_stats(df: pd.DataFrame, deep: bool = False, id_column: Optional[str] = None) -> dict:
+    """
+    Create summary statistics for a DataFrame.
+    
+    Nulls are counted column by column rather than through a full boolean copy
+    of the frame. deep=True measures string contents in memory_usage_mb (slow on
+    wide text frames). If id_column is given, duplicates are counted on that
+    column alone instead of hashing whole rows.
+    """
+    duplicates = df[id_column].duplicated() if id_column is not None else df.duplicated()
     return {
         'total_rows': len(df),
         'total_columns': len(df.columns),
-        'memory_usage_mb': df.memory_usage(deep=True).sum() / (1024 * 1024),
-        'null_values': df.isnull().sum().sum(),
-        'duplicate_rows': df.duplicated().sum()
+        'memory_usage_mb': df.memory_usage(deep=deep).sum() / (1024 * 1024),
+        'null_values': int(sum(df.iloc[:, i].isna().sum() for i in range(df.shape[1]))),
+        'duplicate_rows': int(duplicates.sum())
     }
 
 def format_number(number: float, decimal_places: int = 0) -> str: